@@ -0,0 +1,173 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import opportunities
+
+# an opportunity is posted if it passes any tier: margin >= min_margin and
+# profit on either side > min_profit_sek (None = no profit threshold).
+# optional filters: 'categories' and 'providers' allow-lists (both sides must be allowed),
+# 'min_minutes_to_start' (opportunities with an unparseable start time pass).
+# opportunities with a leg fetched more than 'max_quote_age' seconds ago are stale, and
+# 'stale' decides if they are flagged in the alert or dropped
+DEFAULT_RULES = {
+    'tiers': [
+        {'min_margin': .01, 'min_profit_sek': None}, # high margin -> no profit threshold
+        {'min_margin': .005, 'min_profit_sek': 20.}, # medium margin -> medium profit threshold
+        {'min_margin': .001, 'min_profit_sek': 50.}, # low margin -> high profit threshold
+    ],
+    'max_quote_age': 60.*2.,
+    'stale': 'flag', # or 'drop'
+}
+
+
+def fingerprint(sport:str, cat:str, game_id, line, visitor_provider:str, home_provider:str):
+    """Identity of an opportunity across scans, prices and stakes left out."""
+    return (sport, cat, str(game_id), float(line), visitor_provider, home_provider)
+
+
+def digest(row):
+    """What an alert shows that is worth editing the message for, `row` is a row of an opportunity table."""
+    return (
+        round(row.visitor_price, 3),
+        round(row.home_price, 3),
+        round(row.actual_stake_sek),
+    )
+
+
+def stale_mask(table:pd.DataFrame, rules:dict, now:float=None):
+    """Boolean mask of the rows with a leg older than the rules' `max_quote_age`, unknown ages are not stale."""
+    if rules.get('max_quote_age') is None:
+        return np.zeros(len(table), dtype=bool)
+    return opportunities.quote_age(table, now) > rules['max_quote_age']
+
+
+def evaluate_rules(table:pd.DataFrame, rules:dict, now:float=None):
+    """
+    Boolean mask of the rows of an `opportunities` table that pass `rules`, evaluated column-wise.
+
+    `now` is in epoch seconds, the current time by default.
+    """
+    margin = table['margin'].to_numpy(dtype=float)
+    profit = np.fmax(table['visitor_profit_sek'].to_numpy(dtype=float), table['home_profit_sek'].to_numpy(dtype=float))
+
+    tiers = rules['tiers']
+    min_margin = np.array([tier['min_margin'] for tier in tiers], dtype=float)
+    min_profit = np.array([
+        -np.inf if tier.get('min_profit_sek') is None else tier['min_profit_sek'] for tier in tiers
+    ], dtype=float)
+    passed = ((margin[:, None] >= min_margin) & (profit[:, None] > min_profit)).any(axis=1)
+
+    if rules.get('categories') is not None:
+        passed &= table['cat'].isin(rules['categories']).to_numpy()
+
+    if rules.get('providers') is not None:
+        passed &= table['visitor_provider'].isin(rules['providers']).to_numpy()
+        passed &= table['home_provider'].isin(rules['providers']).to_numpy()
+
+    if rules.get('min_minutes_to_start') is not None:
+        minutes = opportunities.minutes_to_start(table['swe_time'], None if now is None else opportunities.swedish_time(now))
+        passed &= np.isnan(minutes) | (minutes >= rules['min_minutes_to_start'])
+
+    if rules.get('stale') == 'drop':
+        passed &= ~stale_mask(table, rules, now)
+
+    return passed
+
+
+@dataclass
+class Alert:
+    embed: object
+    digest: tuple
+    posted_at: float
+    updated_at: float
+    post: object = None # message holding the embed, None until sent
+    index: int = None # position of the embed in that message
+    cancelled: bool = False
+    fetched_at: float = None # fetch time of the older leg of the opportunity shown
+
+
+class AlertCache:
+    """
+    Bounded TTL/LRU cache of posted alerts keyed by opportunity fingerprint.
+
+    Alerts older than `ttl` seconds are forgotten and the least recently seen ones are
+    evicted above `maxsize`, so an opportunity that reappears after that is posted again.
+    `clock` returns the current time, a simulated one when backtesting.
+    """
+
+    def __init__(self, ttl:float=60.*60.*6., maxsize:int=1024, clock=time.time):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.clock = clock
+        self._alerts = OrderedDict()
+
+    def __len__(self):
+        return len(self._alerts)
+
+    def _prune(self):
+        now = self.clock()
+        while self._alerts and now - next(iter(self._alerts.values())).updated_at > self.ttl:
+            self._alerts.popitem(last=False)
+        while len(self._alerts) > self.maxsize:
+            self._alerts.popitem(last=False)
+
+    def get(self, fingerprint:tuple):
+        self._prune()
+        return self._alerts.get(fingerprint)
+
+    def put(self, fingerprint:tuple, embed, digest:tuple, fetched_at:float=None):
+        now = self.clock()
+        alert = Alert(embed=embed, digest=digest, posted_at=now, updated_at=now, fetched_at=fetched_at)
+        self._alerts[fingerprint] = alert
+        self._alerts.move_to_end(fingerprint)
+        self._prune()
+        return alert
+
+    def touch(self, fingerprint:tuple, embed=None, digest:tuple=None, fetched_at:float=None):
+        alert = self._alerts[fingerprint]
+        alert.updated_at = self.clock()
+        if embed is not None:
+            alert.embed = embed
+        if digest is not None:
+            alert.digest = digest
+        if fetched_at is not None:
+            alert.fetched_at = fetched_at
+        self._alerts.move_to_end(fingerprint)
+
+    def upsert(self, fingerprint:tuple, embed, digest:tuple, fetched_at:float=None):
+        """
+        Record an opportunity seen in a scan, returns (alert, action).
+
+        action is 'post' for a new (or never sent) opportunity, 'edit' when what the alert
+        shows changed and 'keep' otherwise.
+        """
+        alert = self.get(fingerprint)
+        if alert is None or alert.cancelled:
+            return self.put(fingerprint, embed, digest, fetched_at), 'post'
+        if alert.digest != digest:
+            self.touch(fingerprint, embed, digest, fetched_at)
+            return alert, 'edit'
+        self.touch(fingerprint)
+        return alert, 'keep'
+
+    def pop(self, fingerprint:tuple):
+        """Remove and return the alert of one opportunity that closed, None if there is none."""
+        return self._alerts.pop(fingerprint, None)
+
+    def close(self, sport:str, seen:set, missing_providers=()):
+        """
+        Remove and return the alerts of `sport` whose opportunity was not seen in the last scan.
+
+        Alerts on a provider in `missing_providers` stay open, that scan could not see them.
+        """
+        closed = [
+            (fp, alert) for fp, alert in self._alerts.items()
+            if fp[0] == sport and fp not in seen and fp[4] not in missing_providers and fp[5] not in missing_providers
+        ]
+        for fp, _ in closed:
+            del self._alerts[fp]
+        return closed
@@ -0,0 +1,140 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import sizing
+
+MIN_PAYOUT = .01 # SEK, smaller fills are rounding left-overs of a spent balance
+ITEM_COLUMNS = ['cat', 'opportunity', 'size', 'visitor_provider', 'visitor_price', 'home_provider', 'home_price', 'margin']
+
+
+@dataclass
+class Allocation:
+    opportunities: pd.DataFrame # one row per sized opportunity, in the order of the sized frames
+    providers: pd.DataFrame # one row per provider, indexed by provider
+    profit_sek: float
+    bound_sek: float # no allocation of the same balances makes more than this
+
+    @property
+    def gap(self):
+        """Share of `bound_sek` the greedy allocation may leave on the table."""
+        return 1. - self.profit_sek / self.bound_sek if self.bound_sek > 0. else 0.
+
+
+def items(sized:dict, steps:dict=None):
+    """
+    What can be bought across a slate, as rows of `ITEM_COLUMNS`.
+
+    `sized` maps cat -> `sizing.size_opportunities` frame. Each arbitrage is one item of up
+    to its max target payout at the best prices, or with `steps` (cat -> `sizing.ladder_steps`)
+    one item per ladder step with a positive marginal margin. `opportunity` is the row's
+    position in its sized frame, `size` the payout the item holds.
+    """
+    parts = []
+    for cat, cat_sized in sized.items():
+        if steps is not None and cat in steps:
+            cat_steps = steps[cat]
+            size = cat_steps['payout'] - cat_steps.groupby('opportunity', sort=False)['payout'].shift(fill_value=0.)
+            part = cat_steps.assign(cat=cat, size=size, margin=cat_steps['marginal_margin'])
+        else:
+            part = pd.DataFrame({
+                'cat': cat,
+                'opportunity': np.arange(len(cat_sized)),
+                'size': cat_sized['max_target_payout'].to_numpy(dtype=float),
+                'visitor_provider': cat_sized['visitor_provider'].values,
+                'visitor_price': cat_sized['visitor_price'].to_numpy(dtype=float),
+                'home_provider': cat_sized['home_provider'].values,
+                'home_price': cat_sized['home_price'].to_numpy(dtype=float),
+                'margin': cat_sized['margin'].to_numpy(dtype=float),
+            })
+        parts.append(part.loc[(part['margin'] > 0.) & (part['size'] > 0.), ITEM_COLUMNS])
+
+    if not parts:
+        return pd.DataFrame(columns=ITEM_COLUMNS)
+    return pd.concat(parts, ignore_index=True)
+
+
+def allocate(sized:dict, balances:dict, usdsek:float, steps:dict=None):
+    """
+    Spread every provider's balance across all arbitrages of a slate at once.
+
+    `sized` maps cat -> `sizing.size_opportunities` frame and `balances` provider ->
+    balance in the provider's currency, like `size_opportunities`. Items (see `items`)
+    are funded greedily, highest return on stake first, each as far as its size and what is
+    left of both providers' balances allow. Both sides are bought to the same payout, so
+    the profit is guaranteed.
+
+    `bound_sek` is the best profit with the balances pooled, which no allocation can beat,
+    so `gap` bounds how far the greedy allocation is from the optimum.
+    """
+    legs = items(sized, steps)
+    visitor_price = legs['visitor_price'].to_numpy(dtype=float)
+    home_price = legs['home_price'].to_numpy(dtype=float)
+    size = legs['size'].to_numpy(dtype=float)
+    cost = visitor_price + home_price # stake per unit of payout
+    order = np.argsort(-legs['margin'].to_numpy(dtype=float) / cost, kind='stable')
+
+    codes, providers = pd.factorize(pd.concat([legs['visitor_provider'], legs['home_provider']], ignore_index=True))
+    visitor_code, home_code = codes[:len(legs)], codes[len(legs):]
+    balance = pd.Series(providers).map(balances).astype(float).to_numpy()
+    balance = balance * np.where(pd.Series(providers).isin(sizing.USD_PROVIDERS), usdsek, 1.)
+    balance = np.where(np.isnan(balance), np.inf, balance) # no balance known -> volume limit only
+    remaining = balance.copy()
+
+    payout = np.zeros(len(legs))
+    for j in order:
+        v, h = visitor_code[j], home_code[j]
+        if v == h:
+            q = min(size[j], remaining[v] / cost[j])
+        else:
+            q = min(size[j], remaining[v] / visitor_price[j], remaining[h] / home_price[j])
+        if q < MIN_PAYOUT:
+            continue
+        payout[j] = q
+        remaining[v] -= q * visitor_price[j]
+        remaining[h] -= q * home_price[j]
+
+    # pooled balances make one fractional knapsack, solved exactly by the same order
+    stake_cap = np.minimum(size * cost, np.where(visitor_code == home_code, balance[visitor_code], balance[visitor_code] + balance[home_code]))[order]
+    pooled = balance.sum()
+    taken = np.clip(pooled - (np.cumsum(stake_cap) - stake_cap), 0., stake_cap)
+    bound = float((taken * (legs['margin'].to_numpy(dtype=float) / cost)[order]).sum())
+
+    legs = legs.assign(
+        payout=payout,
+        visitor_stake_sek=payout * visitor_price,
+        home_stake_sek=payout * home_price,
+    )
+    funded = legs.groupby(['cat', 'opportunity'])[['payout', 'visitor_stake_sek', 'home_stake_sek']].sum()
+
+    frames = []
+    for cat, cat_sized in sized.items():
+        frame = pd.DataFrame({
+            'cat': cat,
+            'game_id': cat_sized.index.values,
+            'line': cat_sized['line'].to_numpy(dtype=float),
+        })
+        keys = pd.MultiIndex.from_arrays([np.full(len(cat_sized), cat, dtype=object), np.arange(len(cat_sized))])
+        frame[['payout', 'visitor_stake_sek', 'home_stake_sek']] = funded.reindex(keys).fillna(0.).to_numpy()
+        frames.append(frame)
+    opportunities = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=['cat', 'game_id', 'line', 'payout', 'visitor_stake_sek', 'home_stake_sek']
+    )
+    opportunities['stake_sek'] = opportunities['visitor_stake_sek'] + opportunities['home_stake_sek']
+    opportunities['profit_sek'] = opportunities['payout'] - opportunities['stake_sek']
+
+    usage = pd.DataFrame({
+        'balance_sek': balance,
+        'used_sek': (
+            np.bincount(visitor_code, weights=payout * visitor_price, minlength=len(providers))
+            + np.bincount(home_code, weights=payout * home_price, minlength=len(providers))
+        ),
+    }, index=pd.Index(providers, name='provider'))
+
+    return Allocation(
+        opportunities=opportunities,
+        providers=usage,
+        profit_sek=float(opportunities['profit_sek'].sum()),
+        bound_sek=bound,
+    )
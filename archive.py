@@ -0,0 +1,242 @@
+import atexit
+import os
+import queue
+import threading
+import time
+import traceback
+from datetime import datetime, timezone
+from types import MappingProxyType
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+import price_feed
+import sizing
+
+META_COLUMNS = ['fetched_at', 'provider', 'version']
+SORTED = {b'sorted_by': b'fetched_at'} # schema metadata of parts written in fetch order
+
+
+def _date(timestamp:float):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def _to_arrow(df:pd.DataFrame):
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # mixed-type object columns are archived as strings
+        objects = df.select_dtypes(include='object').columns
+        return pa.Table.from_pandas(df.astype({column: 'string' for column in objects}), preserve_index=False)
+
+
+def frames(quotes:price_feed.ProviderQuotes):
+    """The frames of one provider fetch as (frame name, DataFrame), tagged with `META_COLUMNS`."""
+    parts = [('info', quotes.info.rename_axis('game_id').reset_index() if not quotes.info.empty else quotes.info)]
+    parts += [(f'price_{cat}', price_feed._frame(price)) for cat, price in quotes.price.items()]
+    parts += [(f'volume_{cat}', price_feed._frame(volume)) for cat, volume in quotes.volume.items()]
+    for name, df in parts:
+        if df.empty:
+            continue
+        yield name, df.assign(fetched_at=quotes.fetched_at, provider=quotes.provider, version=quotes.version)
+
+
+class SnapshotArchive:
+    """
+    Append-only archive of every provider fetch, as zstd-compressed Arrow IPC files.
+
+    Files are laid out as `{root}/sport=.../date=.../frame=.../part-{ms}.arrow`
+    (hive partitioning, UTC dates), one frame per `info`, `price_{cat}` and
+    `volume_{cat}`. `submit` only puts the fetch on a queue; a background thread
+    converts and buffers it and writes a part per partition every `flush_every` seconds
+    or `flush_rows` rows, so scans are never slowed down by disk I/O. `start` registers a
+    `flush` at exit, call it yourself where the process can end otherwise, buffered fetches
+    are lost if it does not run. Parts are sorted by fetch time and
+    written in record batches of at most `batch_rows` rows, so reads of a time range
+    only decompress the batches they need.
+    """
+
+    def __init__(self, root:str, flush_every:float=60.*5., flush_rows:int=100_000, compression:str='zstd', maxsize:int=1000, batch_rows:int=10_000):
+        self.root = root
+        self.flush_every = flush_every
+        self.flush_rows = flush_rows
+        self.compression = compression
+        self.batch_rows = batch_rows
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._buffers = {} # (sport, date, frame) -> [pa.Table]
+        self._rows = {}
+        self._last_flush = time.time()
+        self._thread = threading.Thread(target=self._run, name='snapshot-archive', daemon=True)
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+            atexit.register(self.flush, 60.)
+        return self
+
+    def submit(self, quotes:price_feed.ProviderQuotes):
+        try:
+            self._queue.put_nowait(quotes)
+        except queue.Full:
+            self.dropped += 1
+            print(f'WARNING: snapshot archive is behind, dropped {quotes.sport} {quotes.provider} quotes')
+
+    def flush(self, timeout:float=None):
+        """Write everything submitted so far, blocks until done. Returns False if it timed out."""
+        if not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        return done.wait(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_every)
+            except queue.Empty:
+                item = None
+
+            try:
+                if isinstance(item, threading.Event):
+                    self._write_all()
+                    item.set()
+                    continue
+                if item is not None:
+                    self._buffer(item)
+                if time.time() - self._last_flush >= self.flush_every:
+                    self._write_all()
+            except Exception:
+                print('ERROR: Failed to archive snapshot')
+                traceback.print_exc()
+
+    def _buffer(self, quotes:price_feed.ProviderQuotes):
+        date = _date(quotes.fetched_at)
+        for name, df in frames(quotes):
+            key = (quotes.sport, date, name)
+            self._buffers.setdefault(key, []).append(_to_arrow(df))
+            self._rows[key] = self._rows.get(key, 0) + len(df)
+            if self._rows[key] >= self.flush_rows:
+                self._write(key)
+
+    def _write_all(self):
+        for key in list(self._buffers):
+            self._write(key)
+        self._last_flush = time.time()
+
+    def _write(self, key:tuple):
+        tables = self._buffers.pop(key, None)
+        self._rows.pop(key, None)
+        if not tables:
+            return
+        table = pa.concat_tables(tables, promote_options='permissive').sort_by('fetched_at')
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **SORTED})
+
+        sport, date, name = key
+        directory = os.path.join(self.root, f'sport={sport}', f'date={date}', f'frame={name}')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'part-{time.time_ns() // 1_000_000}.arrow')
+        with pa.OSFile(path + '.tmp', 'wb') as sink:
+            with ipc.new_file(sink, table.schema, options=ipc.IpcWriteOptions(compression=self.compression)) as writer:
+                writer.write_table(table, max_chunksize=self.batch_rows)
+        os.replace(path + '.tmp', path) # readers never see a partial file
+
+
+def _parts(root:str, sport:str, frame:str, start:float=None, end:float=None):
+    sport_dir = os.path.join(root, f'sport={sport}')
+    if not os.path.isdir(sport_dir):
+        return []
+    first = _date(start) if start is not None else None
+    last = _date(end) if end is not None else None
+
+    paths = []
+    for date_dir in sorted(os.listdir(sport_dir)):
+        date = date_dir.removeprefix('date=')
+        if (first is not None and date < first) or (last is not None and date > last):
+            continue
+        frame_dir = os.path.join(sport_dir, date_dir, f'frame={frame}')
+        if os.path.isdir(frame_dir):
+            paths += [os.path.join(frame_dir, f) for f in sorted(os.listdir(frame_dir)) if f.endswith('.arrow')]
+    return paths
+
+
+def read_frame(root:str, sport:str, frame:str, start:float=None, end:float=None, columns:list=None):
+    """
+    Archived rows of one frame (e.g. 'info', 'price_moneyline') fetched in [start, end).
+
+    Only the date partitions overlapping the range are opened and parts written before
+    `start` are skipped. Parts are memory-mapped and read batch by batch, stopping at the
+    first batch past `end` in parts sorted by fetch time.
+    """
+    tables = []
+    for path in _parts(root, sport, frame, start, end):
+        written = int(os.path.basename(path).removeprefix('part-').removesuffix('.arrow')) / 1000.
+        if start is not None and written < start: # only holds fetches from before it was written
+            continue
+        with pa.memory_map(path) as source:
+            reader = ipc.open_file(source)
+            in_order = (reader.schema.metadata or {}).get(b'sorted_by') == SORTED[b'sorted_by']
+            batches = []
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                fetched_at = batch.column('fetched_at')
+                if in_order and end is not None and len(batch) and pc.min(fetched_at).as_py() >= end:
+                    break
+                if in_order and start is not None and len(batch) and pc.max(fetched_at).as_py() < start:
+                    continue
+                batches.append(batch)
+            table = pa.Table.from_batches(batches, schema=reader.schema)
+        if columns is not None:
+            table = table.select([c for c in list(columns) + META_COLUMNS if c in table.column_names])
+        if start is not None:
+            table = table.filter(pc.greater_equal(table['fetched_at'], start))
+        if end is not None:
+            table = table.filter(pc.less(table['fetched_at'], end))
+        tables.append(table)
+
+    if not tables:
+        return pd.DataFrame(columns=(list(columns) if columns is not None else []) + META_COLUMNS)
+    df = pa.concat_tables(tables, promote_options='permissive').to_pandas()
+    return df.sort_values('fetched_at', kind='stable').reset_index(drop=True)
+
+
+def read_quotes(root:str, sport:str, start:float=None, end:float=None):
+    """
+    Rebuild the archived provider fetches in [start, end) as `price_feed.ProviderQuotes`,
+    in fetch order.
+    """
+    names = set()
+    sport_dir = os.path.join(root, f'sport={sport}')
+    if os.path.isdir(sport_dir):
+        for date_dir in os.listdir(sport_dir):
+            names.update(
+                name.removeprefix('frame=') for name in os.listdir(os.path.join(sport_dir, date_dir))
+            )
+
+    by_fetch = {}
+    for name in sorted(names):
+        df = read_frame(root, sport, name, start, end)
+        for (fetched_at, provider, version), group in df.groupby(META_COLUMNS, sort=False):
+            group = group.drop(columns=META_COLUMNS).reset_index(drop=True)
+            if name.startswith('volume_'): # volume columns are per provider, drop the other providers'
+                group = group.dropna(axis=1, how='all')
+            by_fetch.setdefault((fetched_at, provider, version), {})[name] = group
+
+    for (fetched_at, provider, version), parts in sorted(by_fetch.items()):
+        info = parts.get('info', pd.DataFrame())
+        if 'game_id' in info:
+            info = info.set_index('game_id')
+        price = {name.removeprefix('price_'): df for name, df in parts.items() if name.startswith('price_')}
+        volume = {name.removeprefix('volume_'): df for name, df in parts.items() if name.startswith('volume_')}
+        yield price_feed.ProviderQuotes(
+            sport=sport,
+            provider=provider,
+            version=int(version),
+            fetched_at=float(fetched_at),
+            info=info,
+            price=MappingProxyType(price),
+            volume=MappingProxyType(volume),
+            volume_index=sizing.build_volume_index(volume),
+        )
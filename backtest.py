@@ -0,0 +1,199 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import alerts
+import archive
+import opportunities
+from scheduler import AdaptiveScheduler
+
+DAY = 60.*60.*24.
+
+
+class SimClock:
+    """Simulated time in epoch seconds, moved forward by the replay."""
+
+    def __init__(self, now:float=0.):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@dataclass
+class BacktestReport:
+    scans: int
+    posts: int
+    edits: int
+    expired: int
+    alerts: pd.DataFrame # one row per posted alert
+    lifetimes: pd.DataFrame # one row per opportunity passing the rules, from the archived fetches
+
+    def summary(self):
+        latency = self.alerts['latency'].dropna()
+        lifetime = self.lifetimes['lifetime'].dropna()
+        return {
+            'scans': self.scans,
+            'posts': self.posts,
+            'edits': self.edits,
+            'expired': self.expired,
+            'opportunities': len(self.lifetimes),
+            'missed': int((~self.lifetimes['alerted']).sum()),
+            'latency_to_alert_median': float(latency.median()) if len(latency) else None,
+            'latency_to_alert_p90': float(latency.quantile(.9)) if len(latency) else None,
+            'lifetime_median': float(lifetime.median()) if len(lifetime) else None,
+            'lifetime_p90': float(lifetime.quantile(.9)) if len(lifetime) else None,
+            'theoretical_profit_sek': float(self.alerts['profit_sek'].sum()),
+        }
+
+
+def run_backtest(
+        root:str,
+        sport:str,
+        start:float,
+        end:float,
+        provider_info:dict,
+        usdsek:float,
+        rules:dict=alerts.DEFAULT_RULES,
+        interval:float=60.*3.,
+        scheduler:AdaptiveScheduler=None,
+        bound:float=.0,
+        coalesce:float=10.,
+    ):
+    """
+    Replay the archived fetches of `sport` in [start, end) through the bot's scan logic.
+
+    Scans happen on a simulated clock every `interval` seconds, or at the delays picked by
+    `scheduler` (an `AdaptiveScheduler`, only its `next_delay` is used). Each scan sees
+    the latest archived fetch of every provider at that time, is sized and filtered with
+    `opportunities.from_quotes` and `alerts.evaluate_rules` and deduplicated by an
+    `alerts.AlertCache` exactly like `check_arbitrage`, without the depth and allocation
+    columns none of them use. Scans take no simulated time and
+    cannot be finer than the recorded fetches. Provider balances come from `provider_info`.
+
+    The archived fetches are also evaluated as they come in to find when each opportunity
+    opened and closed, which gives the latency-to-alert and the opportunity lifetimes.
+    Fetches less than `coalesce` seconds apart (the providers of one recorded scan) are
+    evaluated once, after the last of them.
+    The theoretical profit is the guaranteed (smaller side) profit at the time of posting.
+    """
+    clock = SimClock(start)
+    cache = alerts.AlertCache(clock=clock)
+    latest = {} # provider -> latest ProviderQuotes
+    results = {} # version -> (evaluated at, ScanResult), shared by the fetch evaluation and the scans
+    opened = {} # fingerprint -> time the opportunity was first seen passing the rules
+    windows = []
+    posted = []
+    counts = {'scans': 0, 'post': 0, 'edit': 0, 'expired': 0}
+    next_scan = start
+    pending = [] # fetch times not evaluated yet
+
+    def evaluate(at:float):
+        version = tuple(sorted((q.provider, q.version, q.fetched_at) for q in latest.values()))
+        if version not in results:
+            results.clear() # scans only ever need the latest version
+            # the rules and digests only look at the best prices, so the ladders and the allocation are skipped
+            results[version] = at, opportunities.from_quotes(
+                sport, list(latest.values()), provider_info, usdsek, bound, now=opportunities.swedish_time(at),
+                depth=False, allocate=False
+            )
+        return results[version]
+
+    def passing(result, at:float):
+        table = result.table
+        passed = table.loc[alerts.evaluate_rules(table, rules, now=at)]
+        keys = [
+            alerts.fingerprint(sport, row.cat, row.game_id, row.line, row.visitor_provider, row.home_provider)
+            for row in passed.itertuples(index=False)
+        ]
+        return keys, passed
+
+    def on_fetch():
+        if not pending:
+            return
+        at = pending[-1]
+        pending.clear()
+        _, result = evaluate(at)
+        keys, _ = passing(result, at)
+        keys = set(keys)
+        for key in keys - set(opened):
+            opened[key] = at
+        for key in set(opened) - keys:
+            windows.append((key, opened.pop(key), at))
+
+    def scan(at:float):
+        clock.now = at
+        counts['scans'] += 1
+        evaluated_at, result = evaluate(at)
+        keys, passed = passing(result, at)
+        missing = {provider: 'not fetched yet' for provider in provider_info if provider not in latest}
+
+        found = False
+        for key, row in zip(keys, passed.itertuples(index=False)):
+            alert, action = cache.upsert(key, None, alerts.digest(row))
+            if action == 'post':
+                found = True
+                posted.append({
+                    'fingerprint': key,
+                    'cat': row.cat,
+                    'opened_at': opened.get(key, np.nan),
+                    'posted_at': at,
+                    'latency': at - opened.get(key, np.nan),
+                    'quote_age': at - min(row.visitor_fetched_at, row.home_fetched_at),
+                    'margin': row.margin,
+                    'profit_sek': min(row.visitor_profit_sek, row.home_profit_sek),
+                })
+            if action in counts:
+                counts[action] += 1
+        counts['expired'] += len(cache.close(sport, set(keys), missing_providers=missing))
+
+        if scheduler is None:
+            return interval
+        minutes = result.minutes_to_next_start
+        if minutes is not None: # as of this scan rather than the fetch it was computed at
+            minutes = max(minutes - (at - evaluated_at) / 60., 0.)
+        return scheduler.next_delay(minutes, found, now=at)
+
+    day = start
+    while day < end:
+        for quotes in archive.read_quotes(root, sport, day, min(day + DAY, end)):
+            if pending and quotes.fetched_at - pending[0] > coalesce:
+                on_fetch()
+            if not latest: # nothing to scan before the first fetch
+                next_scan = max(next_scan, quotes.fetched_at)
+            # scans due before this fetch see the previous data
+            while latest and next_scan <= quotes.fetched_at:
+                on_fetch()
+                next_scan += scan(next_scan)
+            latest[quotes.provider] = quotes
+            pending.append(quotes.fetched_at)
+        day += DAY
+
+    on_fetch()
+    while latest and next_scan < end:
+        next_scan += scan(next_scan)
+
+    windows += [(key, at, np.inf) for key, at in opened.items()] # still open at the end
+    posted_at = {}
+    for row in posted:
+        posted_at.setdefault(row['fingerprint'], []).append(row['posted_at'])
+    lifetimes = pd.DataFrame({
+        'fingerprint': [key for key, _, _ in windows],
+        'opened_at': [opened_at for _, opened_at, _ in windows],
+        'closed_at': [closed_at if closed_at < np.inf else np.nan for _, _, closed_at in windows],
+        'alerted': [
+            any(opened_at <= at <= closed_at for at in posted_at.get(key, ()))
+            for key, opened_at, closed_at in windows
+        ],
+    })
+    lifetimes['lifetime'] = lifetimes['closed_at'] - lifetimes['opened_at']
+
+    return BacktestReport(
+        scans=counts['scans'],
+        posts=counts['post'],
+        edits=counts['edit'],
+        expired=counts['expired'],
+        alerts=pd.DataFrame(posted, columns=['fingerprint', 'cat', 'opened_at', 'posted_at', 'latency', 'quote_age', 'margin', 'profit_sek']),
+        lifetimes=lifetimes,
+    )
@@ -0,0 +1,248 @@
+"""
+Synthetic benchmarks for the price combination, sizing and alerting hot paths.
+
+    python benchmark.py --games 15 100 --lines 1 5 --providers 3 8 --output benchmarks.jsonl
+
+Every benchmark runs for every combination of slate sizes and appends one JSON line per
+result (timings in seconds, with the commit and library versions) to `--output`, so runs
+on different commits can be compared. Without `--output` the JSON lines go to stdout.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+import alerts
+import allocation
+import opportunities
+import price_feed
+import quote_stream
+import sizing
+
+PROVIDERS = ['polymarket', 'betfair', 'pinnacle', 'unibet', 'bet365', 'betsson', 'draftkings', 'fanduel']
+
+
+def providers(n:int):
+    return (PROVIDERS + [f'provider_{i}' for i in range(len(PROVIDERS), n)])[:n]
+
+
+def synthetic_quotes(games:int, lines:int, n_providers:int, seed:int=0):
+    """
+    One `price_feed.ProviderQuotes` per provider for a slate of `games` games with `lines`
+    spread and total lines each, shaped like `combine_sportbooks_prices` output. Prices are
+    a fair price plus a random vig per provider, so a few cross into arbitrage.
+    """
+    rng = np.random.default_rng(seed)
+    game_id = np.array([f'game_{i}' for i in range(games)], dtype=object)
+    fair = {
+        'moneyline': rng.uniform(.3, .7, games),
+        'spread': rng.uniform(.4, .6, (games, lines)),
+        'total': rng.uniform(.4, .6, (games, lines)),
+    }
+    start = pd.Timestamp.now(tz='Europe/Stockholm').tz_localize(None) + pd.to_timedelta(rng.uniform(10, 600, games), unit='min')
+    info = pd.DataFrame({
+        'visitor_team': [f'Visitor {i}' for i in range(games)],
+        'home_team': [f'Home {i}' for i in range(games)],
+        'swe_time': start.strftime('%Y-%m-%d %H:%M'),
+        'state': 'NOT_STARTED',
+    }, index=pd.Index(game_id, name='game_id'))
+
+    line_offsets = np.arange(lines) - lines // 2
+    spread_visitor = np.repeat(1.5, games)[:, None] + line_offsets
+    total = np.repeat(8.5, games)[:, None] + line_offsets
+
+    quotes = []
+    for provider in providers(n_providers):
+        def prices(p):
+            vig = rng.uniform(-.005, .03, np.shape(p)) / 2.
+            return p + vig, 1. - p + vig
+
+        price, volume = {}, {}
+        visitor, home = prices(fair['moneyline'])
+        price['moneyline'] = pd.DataFrame({
+            'best_moneyline_visitor_price': visitor,
+            'best_moneyline_visitor_price_provider': provider,
+            'best_moneyline_home_price': home,
+            'best_moneyline_home_price_provider': provider,
+        }, index=pd.Index(game_id, name='game_id'))
+        volume['moneyline'] = pd.DataFrame({
+            'game_id': game_id,
+            f'{provider}_moneyline_visitor_volume': rng.uniform(100, 10000, games),
+            f'{provider}_moneyline_home_volume': rng.uniform(100, 10000, games),
+        })
+
+        for cat, line_frame in [
+                ('spread', {'spread_visitor': spread_visitor.ravel(), 'spread_home': -spread_visitor.ravel()}),
+                ('total', {'total': total.ravel()}),
+            ]:
+            visitor_side, home_side = sizing.SIDES[cat]
+            visitor, home = prices(fair[cat])
+            price[cat] = pd.DataFrame({
+                'game_id': np.repeat(game_id, lines),
+                **line_frame,
+                f'best_{cat}_{visitor_side}_price': visitor.ravel(),
+                f'best_{cat}_{visitor_side}_price_provider': provider,
+                f'best_{cat}_{home_side}_price': home.ravel(),
+                f'best_{cat}_{home_side}_price_provider': provider,
+            })
+            volume[cat] = pd.DataFrame({
+                'game_id': np.repeat(game_id, lines),
+                **line_frame,
+                f'{provider}_{cat}_{visitor_side}_volume': rng.uniform(100, 10000, games * lines),
+                f'{provider}_{cat}_{home_side}_volume': rng.uniform(100, 10000, games * lines),
+            })
+
+        quotes.append(price_feed.ProviderQuotes(
+            sport='mlb',
+            provider=provider,
+            version=1,
+            fetched_at=time.time(),
+            info=info,
+            price=MappingProxyType(price),
+            volume=MappingProxyType(volume),
+            volume_index=sizing.build_volume_index(volume),
+        ))
+    return quotes
+
+
+def provider_info(n_providers:int):
+    return {provider: {'balance': 10000., 'url': {'mlb': f'https://{provider}.example'}} for provider in providers(n_providers)}
+
+
+def timed(func, repeat:int):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def benchmarks(quotes:list, info:dict, usdsek:float=10.):
+    """name -> (callable, number of items it processes) for one synthetic slate, set up outside the timing."""
+    data = price_feed.combine_quotes(quotes)
+    balances = {provider: provider_info_['balance'] for provider, provider_info_ in info.items()}
+    table = opportunities.from_prices('mlb', data, info, usdsek, bound=-1.) # every market, not only arbs
+    sized = {
+        cat: sizing.size_opportunities(cat, price, data['volume_index'], balances, usdsek)
+        for cat, price in data['price'].items()
+    }
+    slate = {cat: df.dropna(subset=['max_target_payout']) for cat, df in sized.items()}
+    sized_rows = [row for df in sized.values() for _, row in df.dropna(subset=['max_target_payout']).iterrows()]
+    quote_updates = [quote for provider_quotes in quotes for quote in quote_stream.quotes_from_provider(provider_quotes)]
+
+    def size_categories():
+        for cat, price in data['price'].items():
+            sizing.size_opportunities(cat, price, data['volume_index'], balances, usdsek)
+
+    def size_depth():
+        for cat, cat_sized in slate.items():
+            sizing.with_depth(cat_sized, sizing.ladder_steps(cat, cat_sized, data['ladder'][cat], balances, usdsek))
+
+    def allocate_slate():
+        allocation.allocate(slate, balances, usdsek)
+
+    def row_stakes():
+        # the cards of page.py: precomputed stakes, then an edited bet size
+        for row in sized_rows:
+            sizing.row_stakes(row, 'split')
+            sizing.row_stakes(row, 'split', target_payout=row['max_target_payout'] / 2.)
+
+    def filter_alerts():
+        passed = table.loc[alerts.evaluate_rules(table, alerts.DEFAULT_RULES)]
+        for row in passed.itertuples(index=False):
+            alerts.fingerprint('mlb', row.cat, row.game_id, row.line, row.visitor_provider, row.home_provider)
+            alerts.digest(row)
+
+    def build_embeds():
+        from embeds import build_embed # needs discord
+        for row in table.itertuples(index=False):
+            build_embed(row)
+
+    def stream_updates():
+        quote_stream.QuoteStore(bound=-1.).apply(quote_updates)
+
+    return {
+        'combine_quotes': (lambda: price_feed.combine_quotes(quotes), sum(len(df) for q in quotes for df in q.price.values())),
+        'size_opportunities': (size_categories, sum(len(df) for df in sized.values())),
+        'size_depth': (size_depth, sum(len(df) for df in slate.values())),
+        'allocate': (allocate_slate, sum(len(df) for df in slate.values())),
+        'row_stakes': (row_stakes, len(sized_rows)),
+        'from_quotes': (lambda: opportunities.from_quotes('mlb', quotes, info, usdsek), len(table)),
+        'evaluate_rules': (filter_alerts, len(table)),
+        'build_embeds': (build_embeds, len(table)),
+        'quote_store_apply': (stream_updates, len(quote_updates)),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(games, lines, n_providers, repeat:int=5, only=None, seed:int=0):
+    """Run every benchmark (or the ones in `only`) for every slate size, yields one result dict each."""
+    environment = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+    }
+    for games_, lines_, providers_ in itertools.product(games, lines, n_providers):
+        quotes = synthetic_quotes(games_, lines_, providers_, seed)
+        for name, (func, items) in benchmarks(quotes, provider_info(providers_)).items():
+            if only and name not in only:
+                continue
+            try:
+                func() # warm up
+                times = timed(func, repeat)
+            except ImportError as e:
+                print(f'skipping {name}: {e}')
+                continue
+            yield {
+                'benchmark': name,
+                'games': games_,
+                'lines': lines_,
+                'providers': providers_,
+                'items': items,
+                'repeat': repeat,
+                'min': min(times),
+                'median': float(np.median(times)),
+                'mean': float(np.mean(times)),
+                'timestamp': time.time(),
+                **environment,
+            }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--games', type=int, nargs='+', default=[15, 100])
+    parser.add_argument('--lines', type=int, nargs='+', default=[1, 5])
+    parser.add_argument('--providers', type=int, nargs='+', default=[3, 8])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', help='benchmark names to run')
+    parser.add_argument('--output', default='-', help="JSON lines file to append to, '-' for stdout")
+    args = parser.parse_args()
+
+    for result in run(args.games, args.lines, args.providers, args.repeat, args.only):
+        if args.output == '-':
+            print(json.dumps(result))
+            continue
+        with open(args.output, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+        print(
+            f"{result['benchmark']:<22} games={result['games']:<4} lines={result['lines']:<3} "
+            f"providers={result['providers']:<3} median={result['median']*1000:.2f} ms"
+        )
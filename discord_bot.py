@@ -0,0 +1,310 @@
+import discord
+from discord.ext import commands
+import time
+import asyncio
+import traceback
+import os
+import random
+import signal
+import numpy as np
+import pandas as pd
+import cutgems_utils.get as get
+from cutgems_utils.get.arbitrage import arbitrage
+from scan_worker import ScanWorker, LoopLagMonitor
+from scheduler import AdaptiveScheduler
+from archive import SnapshotArchive
+from send_queue import SendQueue
+from embeds import build_embed
+from quote_stream import QuoteStore, event_data, poll_provider, run_stream
+import alerts
+import metrics
+import opportunities
+import sizing
+
+PROVIDER_INFO = arbitrage.PROVIDER_INFO
+SCAN_WORKER = ScanWorker() # shared by all sports: scans run off the gateway loop and keep provider connections warm
+LOOP_LAG = LoopLagMonitor()
+PROVIDER_TIMEOUT = 30. # seconds per provider, late providers are left out of the scan
+USDSEK = {'value': None, 'fetched_at': 0.} # shared by all sports
+ALERT_CACHE = alerts.AlertCache() # posted alerts, so an open arb is edited instead of re-posted
+SEND_QUEUE = SendQueue() # scans hand alerts over and return, a sender task talks to Discord
+# every provider fetch is archived when ARCHIVE_DIR is set
+ARCHIVE = SnapshotArchive(os.getenv("ARCHIVE_DIR")).start() if os.getenv("ARCHIVE_DIR") else None
+
+# Discord
+APPLICATION_KEY = os.getenv("APPLICATION_KEY")
+
+# Prometheus metrics are served on http://0.0.0.0:METRICS_PORT/metrics when METRICS_PORT is set
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS = {}
+SCAN_SECONDS = metrics.Histogram('arb_scan_seconds', 'Duration of a full scan (fetch, combine and size).', ['sport'])
+SCAN_FAILURES = metrics.Counter('arb_scan_failures_total', 'Scans that timed out or raised.', ['sport', 'error'])
+LAST_SCAN = metrics.Gauge('arb_last_scan_timestamp_seconds', 'When the last successful scan finished.', ['sport'])
+PROVIDER_SECONDS = metrics.Histogram('arb_provider_fetch_seconds', 'Duration of one provider fetch.', ['sport', 'provider'])
+PROVIDER_FAILURES = metrics.Counter('arb_provider_failures_total', 'Provider fetches that timed out or failed.', ['sport', 'provider', 'error'])
+OPPORTUNITIES = metrics.Gauge('arb_opportunities', 'Opportunities found by the last scan.', ['sport', 'cat'])
+OPPORTUNITIES_PASSING = metrics.Gauge('arb_opportunities_passing', 'Opportunities of the last scan passing the alert rules.', ['sport', 'cat'])
+ALERTS = metrics.Counter('arb_alerts_total', 'Alerts queued (post, edit), suppressed as unchanged, or expired.', ['sport', 'action'])
+
+# when STREAM_INTERVAL is set, quotes are streamed instead of scanned on a schedule: every provider is
+# polled on its own every STREAM_INTERVAL seconds and only the markets whose quotes changed are re-evaluated
+STREAM_INTERVAL = os.getenv("STREAM_INTERVAL")
+STREAMS = {} # sport -> future of its stream on the scan worker
+STREAM_ALERTS = {} # (sport, game_id, cat, line) -> fingerprint of the alert showing that market
+
+# sports without a channel configured are skipped, rules decide which opportunities get posted
+SPORTS = [
+    {'sport': 'mlb', 'channel_id': os.getenv("MLB_CHANNEL_ID"), 'interval': 60.*3., 'rules': alerts.DEFAULT_RULES},
+    {'sport': 'nfl', 'channel_id': os.getenv("NFL_CHANNEL_ID"), 'interval': 60.*5., 'rules': alerts.DEFAULT_RULES},
+]
+SPORTS = [{**entry, 'channel_id': int(entry['channel_id'])} for entry in SPORTS if entry['channel_id']]
+
+intents = discord.Intents.default()
+intents.message_content = True
+
+# longer rate limit waits are raised as discord.RateLimited and handled by SEND_QUEUE
+bot = commands.Bot(command_prefix='/', intents=intents, max_ratelimit_timeout=30.)
+
+# one scheduler per sport, all on the bot's event loop so scans for different sports overlap.
+# `interval` is the base interval, scans speed up near game starts and after a new opportunity
+# was posted and slow down when nothing is scheduled
+SCHEDULERS = {entry['sport']: AdaptiveScheduler(entry['sport'], base_interval=entry['interval']) for entry in SPORTS}
+
+def scan_job(sport:str, channel_id:int, rules:dict):
+    async def scan():
+        return await check_arbitrage(sport=sport, channel_id=channel_id, rules=rules)
+    return scan
+
+@bot.event
+async def setup_hook():
+    # containers are stopped with SIGTERM, which bot.run does not handle (only Ctrl+C): close the bot
+    # instead, so bot.run returns and the shutdown at the end of this file runs before the process exits
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, lambda: loop.create_task(bot.close()))
+    except NotImplementedError: # no signal handlers on Windows event loops
+        pass
+
+@bot.event
+async def on_ready():
+    print(f'{bot.user.name} has connected to Discord!')
+    
+    # Debug information
+    print("\nServer and Channel Information:")
+    for guild in bot.guilds:
+        print(f"\nServer: {guild.name} (ID: {guild.id})")
+        print("Text Channels:")
+        for channel in guild.text_channels:
+            print(f"- #{channel.name}: {channel.id}")
+    
+    for entry in SPORTS:
+        channel = bot.get_channel(entry['channel_id'])
+        if channel:
+            print(f'\nTarget {entry["sport"]} channel found: #{channel.name}')
+            permissions = channel.permissions_for(channel.guild.me)
+            print(f'Bot can view channel: {permissions.view_channel}')
+            print(f'Bot can send messages: {permissions.send_messages}')
+        else:
+            print(f'\nERROR: Could not find {entry["sport"]} channel {entry["channel_id"]}')
+            print('Please check:')
+            print('1. The bot is invited to the correct server')
+            print('2. The channel ID is correct')
+            print('3. The bot has permission to view the channel')
+    
+    LOOP_LAG.start()
+    SEND_QUEUE.start()
+    if METRICS_PORT and 'server' not in METRICS:
+        METRICS['server'] = await metrics.start_server(int(METRICS_PORT))
+    for entry in SPORTS:
+        if STREAM_INTERVAL:
+            if entry['sport'] not in STREAMS:
+                STREAMS[entry['sport']] = SCAN_WORKER.submit(stream_arbitrage(
+                    entry['sport'], bot.get_channel(entry['channel_id']), entry['rules'],
+                    float(STREAM_INTERVAL), asyncio.get_running_loop()
+                ))
+                STREAMS[entry['sport']].add_done_callback(stream_stopped(entry['sport']))
+        else:
+            SCHEDULERS[entry['sport']].start(scan_job(entry['sport'], entry['channel_id'], entry['rules']))
+
+async def get_usdsek():
+    if USDSEK['value'] is None or time.time() - USDSEK['fetched_at'] > 60.*5.:
+        USDSEK['value'] = await asyncio.to_thread(get.usdsek)
+        USDSEK['fetched_at'] = time.time()
+    return USDSEK['value']
+
+def queue_alert(channel, alert_key:tuple, embed:discord.Embed, digest:tuple, profit:float, fetched_at:float=None):
+    # new opportunity -> post, changed price/stake -> edit the posted message, unchanged -> nothing
+    alert, action = ALERT_CACHE.upsert(alert_key, embed, digest, fetched_at)
+    ALERTS.inc(sport=alert_key[0], action='suppressed' if action == 'keep' else action)
+    if action == 'post':
+        SEND_QUEUE.post(channel, alert, profit)
+    elif action == 'edit' and alert.post is not None: # still queued otherwise, and sent with the new embed
+        SEND_QUEUE.edit(alert, profit)
+    return action
+
+def expire_alert(sport:str, alert):
+    ALERTS.inc(sport=sport, action='expired')
+    if alert.post is None:
+        alert.cancelled = True
+        return
+    embed = alert.embed.copy()
+    embed.title = f'❌ Expired: {embed.title}'
+    embed.color = discord.Color.red()
+    alert.embed = embed
+    SEND_QUEUE.edit(alert, profit=0.)
+
+def expire_alerts(sport:str, seen:set, missing:dict):
+    # mark alerts whose arbitrage has closed since the last scan
+    for alert_key, alert in ALERT_CACHE.close(sport, seen, missing_providers=missing):
+        expire_alert(sport, alert)
+
+def stream_alert(channel, market:tuple, row, embed:discord.Embed, digest:tuple):
+    # on the bot's loop: post or edit the alert of a streamed market, expire what it showed before
+    previous = STREAM_ALERTS.pop(market, None)
+    alert_key = alerts.fingerprint(market[0], row.cat, row.game_id, row.line, row.visitor_provider, row.home_provider) if row is not None else None
+    if previous is not None and previous != alert_key:
+        alert = ALERT_CACHE.pop(previous)
+        if alert is not None:
+            expire_alert(market[0], alert)
+    if row is None:
+        return
+    STREAM_ALERTS[market] = alert_key
+    fetched_at = min(row.visitor_fetched_at, row.home_fetched_at)
+    queue_alert(
+        channel, alert_key, embed, digest,
+        profit=max(row.visitor_profit_sek, row.home_profit_sek),
+        fetched_at=None if np.isnan(fetched_at) else float(fetched_at)
+    )
+
+async def stream_arbitrage(sport:str, channel, rules:dict, interval:float, bot_loop):
+    # runs on the scan worker, events are sized there and handed to the bot's loop to be sent
+    store = QuoteStore(bound=.0)
+    info = {} # provider -> game info of its last fetch
+
+    def on_fetch(quotes):
+        info[quotes.provider] = quotes.info
+        if ARCHIVE is not None:
+            ARCHIVE.submit(quotes)
+
+    def on_events(events):
+        # every event of one polled batch is sized in a single pass
+        found = {} # (cat, game_id, line) -> (row, embed, digest) of the markets passing the rules
+        try:
+            opened = [event for event in events if event.kind != 'close']
+            if opened and info:
+                games = pd.concat(list(info.values()))
+                table = opportunities.from_prices(sport, event_data(opened, games.loc[~games.index.duplicated()]), PROVIDER_INFO, USDSEK['value'])
+                passed = table.loc[alerts.evaluate_rules(table, rules)]
+                for row, row_stale in zip(passed.itertuples(index=False), alerts.stale_mask(passed, rules)):
+                    found[(row.cat, row.game_id, row.line)] = row, build_embed(row, stale=bool(row_stale)), alerts.digest(row)
+        except Exception:
+            print(f'ERROR: Failed to size {sport} stream events')
+            traceback.print_exc()
+            events = [event for event in events if event.kind == 'close'] # closed markets still expire their alerts
+
+        for event in events:
+            print(f'{sport} stream: {event.kind} {event.cat} {event.game_id} {event.line}, margin {event.margin*100:.2f}%, {event.latency*1000:.0f} ms after the quote')
+            row, embed, digest = found.get((event.cat, event.game_id, event.line), (None, None, None))
+            bot_loop.call_soon_threadsafe(stream_alert, channel, (sport, event.game_id, event.cat, event.line), row, embed, digest)
+
+    async def refresh_usdsek():
+        while True:
+            await asyncio.sleep(60.)
+            await get_usdsek()
+
+    await get_usdsek()
+    feeds = [
+        poll_provider(sport, provider, PROVIDER_INFO, interval, scan_context=SCAN_WORKER.context, on_fetch=on_fetch)
+        for provider in PROVIDER_INFO
+    ]
+    await asyncio.gather(run_stream(store, feeds, on_events), refresh_usdsek())
+
+def stream_stopped(sport:str):
+    def callback(future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f'ERROR: {sport} quote stream stopped: {future.exception()!r}')
+    return callback
+
+async def check_arbitrage(sport:str, channel_id:int, rules:dict):
+    try:
+        channel = bot.get_channel(channel_id)
+        if channel is None:
+            print(f'ERROR: Could not find channel {channel_id}')
+            return
+        
+        await asyncio.sleep(random.randint(0,9))
+
+        usdsek = await get_usdsek()
+
+        # every provider has its own deadline, the overall timeout is only a safety net
+        async with asyncio.timeout(60):
+            result, scan_stats = await SCAN_WORKER.scan(
+                opportunities.scan_opportunities,
+                sport=sport,
+                provider_info=PROVIDER_INFO,
+                usdsek=usdsek,
+                bound=.0,
+                provider_timeout=PROVIDER_TIMEOUT,
+                archive=ARCHIVE
+            )
+
+        table, missing = result.table, result.missing
+        print(
+            f'checked for {sport} arbitrage, time: {time.strftime("%Y-%m-%d %H:%M:%S")}, '
+            f'connections: {scan_stats.reused_connections} reused / {scan_stats.new_connections} new'
+        )
+
+        SCAN_SECONDS.observe(scan_stats.duration, sport=sport)
+        for stats in result.provider_stats.values():
+            print(stats.log_line())
+            PROVIDER_SECONDS.observe(stats.duration, sport=sport, provider=stats.provider)
+            if stats.error is not None:
+                PROVIDER_FAILURES.inc(sport=sport, provider=stats.provider, error=stats.error)
+
+        if missing:
+            print(f'{sport}: scanned without {", ".join(f"{provider} ({reason})" for provider, reason in missing.items())}')
+
+        # one vectorized pass of the channel's alert rules over every opportunity
+        passed = table.loc[alerts.evaluate_rules(table, rules)]
+        stale = alerts.stale_mask(passed, rules)
+        fetched_at = np.minimum(passed['visitor_fetched_at'].to_numpy(dtype=float), passed['home_fetched_at'].to_numpy(dtype=float))
+        print(f'{sport}: {len(table)} opportunities, {len(passed)} passing the alert rules')
+        found, passing = table['cat'].value_counts(), passed['cat'].value_counts()
+        for cat in sizing.SIDES:
+            OPPORTUNITIES.set(found.get(cat, 0), sport=sport, cat=cat)
+            OPPORTUNITIES_PASSING.set(passing.get(cat, 0), sport=sport, cat=cat)
+
+        seen, posted = set(), 0
+        for row, row_stale, row_fetched_at in zip(passed.itertuples(index=False), stale, fetched_at):
+            alert_key = alerts.fingerprint(sport, row.cat, row.game_id, row.line, row.visitor_provider, row.home_provider)
+            seen.add(alert_key)
+            action = queue_alert(
+                channel, alert_key, build_embed(row, missing, stale=row_stale), alerts.digest(row),
+                profit=max(row.visitor_profit_sek, row.home_profit_sek),
+                fetched_at=None if np.isnan(row_fetched_at) else float(row_fetched_at)
+            )
+            posted += action == 'post'
+
+        expire_alerts(sport, seen, missing)
+        LAST_SCAN.set(time.time(), sport=sport)
+
+        # only a newly posted opportunity speeds the scans up, one staying open for hours does not
+        return result.minutes_to_next_start, posted > 0
+
+    except asyncio.TimeoutError:
+        SCAN_FAILURES.inc(sport=sport, error='TimeoutError')
+        print(f"{sport} arbitrage check timed out after 60 seconds")
+    except Exception as e:
+        SCAN_FAILURES.inc(sport=sport, error=type(e).__name__)
+        print(f"Error in {sport} check_arbitrage: {str(e)}")
+        traceback.print_exc()
+        
+bot.run(APPLICATION_KEY)
+
+# bot.run returns once the bot is closed: stop the streams, close the worker's connections
+# and write what the archive still buffers
+for stream in STREAMS.values():
+    stream.cancel()
+SCAN_WORKER.close()
+if ARCHIVE is not None:
+    ARCHIVE.flush(timeout=60.)
\ No newline at end of file
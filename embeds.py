@@ -0,0 +1,92 @@
+import math
+
+import discord
+
+EMBED_TITLES = {
+    'moneyline': "🏆 Moneyline Arbitrage Found!",
+    'spread': "↔️ Spread Arbitrage Found!",
+    'total': "📊 Total Arbitrage Found!",
+}
+
+
+def quote_time(fetched_at:float):
+    # Discord renders it relative to the reader's clock ("2 minutes ago"), so the age stays current
+    return f"<t:{int(fetched_at)}:R>" if not math.isnan(fetched_at) else "unknown"
+
+
+def build_embed(row, missing:dict=None, stale:bool=False):
+    # row of an opportunities table, missing: providers left out of the scan,
+    # stale: a leg is older than the rules' max quote age
+
+    embed = discord.Embed(
+        title=EMBED_TITLES.get(row.cat, f"{row.cat.title()} Arbitrage Found!"),
+        color=discord.Color.orange() if stale else discord.Color.green()
+    )
+    
+    # Game details
+    game_details = (
+        f"**{row.visitor_team} @ {row.home_team}**\n"
+        + (f"*Line: {row.line}*\n" if row.cat != 'moneyline' else "")
+        + f"Start Time {row.swe_time}\n"
+        f"Margin: {row.margin*100:.2f}%\n"
+        f"Total Stake: {row.actual_stake_sek:,.2f} SEK"
+    )
+    # what is left for it once the balances are shared with the rest of the slate
+    allocated_stake = getattr(row, 'allocated_stake_sek', math.nan)
+    if allocated_stake < row.actual_stake_sek - .01:
+        game_details += f"\nAllocated Stake: {allocated_stake:,.2f} SEK (profit {row.allocated_profit_sek:,.2f} SEK, balances shared with the slate)"
+    embed.add_field(name="Game Details", value=game_details, inline=False)
+    
+    for bet, side, side_line in [("Bet 1", 'visitor', -row.line), ("Bet 2", 'home', row.line)]:
+        field = lambda name: getattr(row, f'{side}_{name}')
+
+        # Format bet size and payout with currency conversion if needed
+        stake_sek = field('stake_sek')
+        payout_sek = field('payout_sek')
+        
+        if field('ccy') == 'USD':
+            bet_str = f"${(stake_sek/row.usdsek):,.2f} ({stake_sek:,.2f} SEK)"
+            payout_str = f"${(payout_sek/row.usdsek):,.2f} ({payout_sek:,.2f} SEK)"
+        else:
+            bet_str = f"{stake_sek:,.2f} SEK"
+            payout_str = f"{payout_sek:,.2f} SEK"
+        
+        details = (
+            (f"Line: {side_line}\n" if row.cat == 'spread' else "")
+            + f"Provider: {field('provider')}\n"
+            f"Odds: {field('odds'):.3f}\n"
+            f"Price: {field('price'):.3f}\n"
+            f"Bet Size: {bet_str}\n"
+            f"Potential Payout: {payout_str}\n"
+            f"Potential Profit: {field('profit_sek'):,.2f} SEK ({field('profit_percentage'):.2f}%)\n"
+            f"Quote fetched: {quote_time(field('fetched_at'))}\n"
+            f"link: {field('url')}"
+        )
+        embed.add_field(
+            name=f"{bet}: {field('team')}", 
+            value=details, 
+            inline=True
+        )
+    
+    # deeper levels that still leave a margin, possibly at other providers
+    depth_profit = getattr(row, 'depth_profit_sek', math.nan)
+    if depth_profit > min(row.visitor_profit_sek, row.home_profit_sek):
+        embed.add_field(
+            name="📚 Depth",
+            value=(
+                f"Up to {row.depth_target_payout:,.2f} SEK payout across the ladder\n"
+                f"Total Stake: {row.depth_stake_sek:,.2f} SEK\n"
+                f"Profit: {depth_profit:,.2f} SEK ({row.depth_margin*100:.2f}% average margin)"
+            ),
+            inline=False
+        )
+
+    if stale:
+        embed.add_field(name="⚠️ Stale quotes", value="A leg is older than the max quote age, check the prices before betting", inline=False)
+
+    if missing:
+        embed.set_footer(text=f'Missing providers: {", ".join(missing)}')
+
+    # Add timestamp
+    embed.timestamp = discord.utils.utcnow()
+    return embed
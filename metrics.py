@@ -0,0 +1,140 @@
+import math
+import os
+import resource
+import threading
+
+from aiohttp import web
+
+REGISTRY = [] # every metric, in definition order
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30., 60.)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class Metric:
+    """
+    A metric family in the Prometheus text format, one sample per label combination.
+
+    Values may be updated from any thread. Metrics register themselves in `REGISTRY` and
+    are served by `start_server`.
+    """
+    type = None
+
+    def __init__(self, name:str, documentation:str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels:dict):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(f'{self.name}{_labels(self.labelnames, key)}', value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines += [f'{name} {_number(value)}' for name, value in self.samples()]
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount:float=1., **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, name:str, documentation:str, labelnames=(), function=None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function # read at scrape time instead of set, only without labels
+
+    def set(self, value:float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.function is not None:
+            return [(self.name, self.function())]
+        return super().samples()
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name:str, documentation:str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value:float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in values:
+            for bound, count in zip(self.buckets, counts):
+                samples.append((f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _number(bound))])}', count))
+            samples.append((f'{self.name}_sum{_labels(self.labelnames, key)}', total))
+            samples.append((f'{self.name}_count{_labels(self.labelnames, key)}', counts[-1]))
+        return samples
+
+
+def resident_memory_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024. # peak, in KiB on Linux
+
+
+Gauge('process_resident_memory_bytes', 'Resident memory size in bytes.', function=resident_memory_bytes)
+
+
+def render():
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+async def start_server(port:int, host:str='0.0.0.0'):
+    """Serve `REGISTRY` at http://host:port/metrics on the running event loop."""
+    async def handle(request):
+        return web.Response(body=render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f'metrics served on http://{host}:{port}/metrics')
+    return runner
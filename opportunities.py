@@ -0,0 +1,222 @@
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+import allocation
+import price_feed
+import sizing
+
+SIDE_FIELDS = {
+    'team': 'string',
+    'provider': 'category',
+    'price': 'float64',
+    'odds': 'float64',
+    'stake_sek': 'float64',
+    'payout_sek': 'float64',
+    'profit_sek': 'float64',
+    'profit_percentage': 'float64',
+    'ccy': 'category',
+    'url': 'string',
+    'fetched_at': 'float64', # when the quote of this leg was fetched, epoch seconds
+}
+
+# most profitable size across the price ladders, see `sizing.with_depth`
+DEPTH_COLUMNS = ['depth_target_payout', 'depth_stake_sek', 'depth_profit_sek', 'depth_margin']
+
+# allocation column -> `allocation.allocate` field, the share of the balances this opportunity gets within the slate
+ALLOCATION_COLUMNS = {
+    'allocated_payout': 'payout',
+    'allocated_stake_sek': 'stake_sek',
+    'allocated_profit_sek': 'profit_sek',
+}
+
+# one row per opportunity
+SCHEMA = {
+    'sport': 'category',
+    'cat': 'category',
+    'game_id': 'string',
+    'line': 'float64',
+    'swe_time': 'string',
+    'margin': 'float64',
+    'actual_stake_sek': 'float64',
+    'usdsek': 'float64',
+    **{column: 'float64' for column in DEPTH_COLUMNS},
+    **{column: 'float64' for column in ALLOCATION_COLUMNS},
+    **{f'visitor_{field}': dtype for field, dtype in SIDE_FIELDS.items()},
+    **{f'home_{field}': dtype for field, dtype in SIDE_FIELDS.items()},
+}
+
+
+@dataclass
+class ScanResult:
+    table: pd.DataFrame
+    missing: dict = field(default_factory=dict) # provider -> reason it was left out
+    provider_stats: dict = field(default_factory=dict) # provider -> price_feed.ProviderStats
+    minutes_to_next_start: float = None # None when no game is scheduled
+
+
+def swedish_time(timestamp:float):
+    """Epoch seconds as the naive Swedish local time used for `swe_time`."""
+    return pd.Timestamp(timestamp, unit='s', tz='UTC').tz_convert('Europe/Stockholm').tz_localize(None)
+
+
+def minutes_to_start(swe_time, now:pd.Timestamp=None):
+    """Minutes until each start time (Swedish local time), NaN where it cannot be parsed."""
+    now = pd.Timestamp.now(tz='Europe/Stockholm').tz_localize(None) if now is None else now
+    start = pd.to_datetime(pd.Series(swe_time, dtype=object), errors='coerce')
+    return ((start - now).dt.total_seconds() / 60.).to_numpy(dtype=float)
+
+
+def quote_age(table:pd.DataFrame, now:float=None):
+    """Seconds since the older leg of each opportunity was fetched, NaN where unknown."""
+    now = time.time() if now is None else now
+    fetched_at = np.minimum(table['visitor_fetched_at'].to_numpy(dtype=float), table['home_fetched_at'].to_numpy(dtype=float))
+    return now - fetched_at
+
+
+def empty_table():
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in SCHEMA.items()})
+
+
+def from_prices(
+        sport:str,
+        data:dict,
+        provider_info:dict,
+        usdsek:float,
+        bound:float=.0,
+        margin_split:str='split',
+        depth:bool=True,
+        allocate:bool=True,
+    ):
+    """
+    Opportunity table sized from combined prices (`price_feed.combine_quotes` output).
+
+    Rows are the not-started games with a margin of at least `bound`, sized to the max
+    target payout with `sizing.size_opportunities` and split by `margin_split`, along
+    with the best size across the price ladders when `data` has them. The `allocated_*`
+    columns share the balances across all rows with `allocation.allocate` instead.
+    Without `depth` or `allocate` those columns are left NaN, which is much cheaper
+    when only the top of the book matters (alert rules, digests).
+    """
+    info = data['info']
+    not_started = info.index[info['state'] == 'NOT_STARTED'] if 'state' in info else info.index
+    balances = {provider: info_['balance'] for provider, info_ in provider_info.items()}
+
+    sized_by_cat = {}
+    for cat, price in data['price'].items():
+        price = price.loc[(price['margin'] >= bound) & price['game_id'].isin(not_started)]
+        sized_by_cat[cat] = sizing.size_opportunities(
+            cat=cat,
+            price=price,
+            volume_index=data['volume_index'],
+            balances=balances,
+            usdsek=usdsek,
+            ladder=data.get('ladder', {}).get(cat) if depth else None,
+        ).dropna(subset=['max_target_payout'])
+
+    # the whole slate at once, so opportunities on the same provider do not count its balance twice
+    allocated = allocation.allocate(sized_by_cat, balances, usdsek).opportunities if allocate else None
+
+    tables = []
+    for cat, sized in sized_by_cat.items():
+        if sized.empty:
+            continue
+
+        teams = info.reindex(sized.index)
+        table = pd.DataFrame({
+            'sport': sport,
+            'cat': cat,
+            'game_id': sized.index.astype(str),
+            'line': sized['line'].astype(float).values,
+            'swe_time': teams['swe_time'].astype(str).values,
+            'margin': sized['margin'].values,
+            'actual_stake_sek': sized[f'actual_stake_sek_{margin_split}'].values,
+            'usdsek': usdsek,
+        })
+        for column in DEPTH_COLUMNS:
+            table[column] = sized[column].values if column in sized else np.nan
+        for column, field in ALLOCATION_COLUMNS.items():
+            table[column] = allocated.loc[allocated['cat'] == cat, field].values if allocated is not None else np.nan
+        for side in ('visitor', 'home'):
+            if cat == 'total': # UNDER = VISITOR, OVER = HOME
+                table[f'{side}_team'] = 'Under' if side == 'visitor' else 'Over'
+            else:
+                table[f'{side}_team'] = teams[f'{side}_team'].values
+            table[f'{side}_provider'] = sized[f'{side}_provider'].values
+            table[f'{side}_price'] = sized[f'{side}_price'].values
+            table[f'{side}_odds'] = 1. / sized[f'{side}_price'].values
+            for field in ['stake_sek', 'payout_sek', 'profit_sek', 'profit_percentage']:
+                table[f'{side}_{field}'] = sized[f'{side}_{field}_{margin_split}'].values
+            table[f'{side}_ccy'] = sized[f'{side}_ccy'].values
+            table[f'{side}_fetched_at'] = sized[f'{side}_fetched_at'].values
+            table[f'{side}_url'] = [provider_info[p]['url'].get(sport) for p in sized[f'{side}_provider']]
+        tables.append(table)
+
+    if not tables:
+        return empty_table()
+    return pd.concat(tables, ignore_index=True)[list(SCHEMA)].astype(SCHEMA)
+
+
+async def scan_opportunities(
+        sport:str,
+        provider_info:dict,
+        usdsek:float,
+        bound:float=.0,
+        provider_timeout:float=price_feed.DEFAULT_TIMEOUT,
+        overrides:dict=None,
+        session=None,
+        archive=None,
+    ):
+    """
+    `ScanResult` across the providers that answered within `provider_timeout`.
+
+    Every provider is fetched with its own deadline, late or failing ones are left out
+    and listed in `missing`. `minutes_to_next_start` is the time until the first game
+    that has not started yet, `provider_stats` what each fetch cost. Fetched quotes are
+    handed to `archive` (an `archive.SnapshotArchive`) when given.
+    """
+    quotes, missing, stats = await price_feed.fetch_quotes(
+        sport=sport,
+        provider_info=provider_info,
+        overrides=overrides,
+        timeout=provider_timeout,
+        session=session
+    )
+    if archive is not None:
+        for provider_quotes in quotes:
+            archive.submit(provider_quotes)
+    result = from_quotes(sport, quotes, provider_info, usdsek, bound, missing)
+    result.provider_stats = stats
+    return result
+
+
+def from_quotes(
+        sport:str,
+        quotes:list,
+        provider_info:dict,
+        usdsek:float,
+        bound:float=.0,
+        missing:dict=None,
+        now:pd.Timestamp=None,
+        depth:bool=True,
+        allocate:bool=True,
+    ):
+    """
+    `ScanResult` of already fetched `price_feed.ProviderQuotes`, as of `now` (Swedish local
+    time). `depth` and `allocate` are passed on to `from_prices`, without `depth` the
+    ladders are not built either.
+    """
+    data = price_feed.combine_quotes(quotes, ladder=depth)
+
+    info = data['info']
+    upcoming = info.loc[info['state'] == 'NOT_STARTED', 'swe_time'] if 'state' in info else pd.Series(dtype=object)
+    minutes = minutes_to_start(upcoming, now)
+    minutes = minutes[minutes >= 0.]
+
+    return ScanResult(
+        table=from_prices(sport, data, provider_info, usdsek, bound, depth=depth, allocate=allocate),
+        missing=missing or {},
+        minutes_to_next_start=float(minutes.min()) if len(minutes) else None,
+    )
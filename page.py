@@ -0,0 +1,480 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import os
+import time
+import traceback
+from dataclasses import asdict
+import cutgems_utils.get as get
+from cutgems_utils.get.arbitrage import arbitrage
+import sizing
+import price_feed
+import allocation
+from archive import SnapshotArchive
+
+OVERRIDES = {}
+PROVIDER_TTL = {} # provider -> seconds between fetches, defaults to 5 minutes
+MAX_QUOTE_AGE = 60.*10. # seconds, opportunities with an older leg are flagged
+
+@st.cache_resource
+def get_archive():
+    # every provider fetch of every sport is archived when ARCHIVE_DIR is set, like in the bot
+    return SnapshotArchive(os.getenv("ARCHIVE_DIR")).start() if os.getenv("ARCHIVE_DIR") else None
+
+@st.cache_resource
+def get_price_feed(sport:str):
+    # one background refresher per sport, shared by all sessions and caching quotes per provider
+    return price_feed.PriceFeed(
+        sport=sport,
+        provider_info=arbitrage.PROVIDER_INFO,
+        overrides=OVERRIDES,
+        ttl=PROVIDER_TTL,
+        archive=get_archive()
+    ).start()
+
+@st.cache_data(ttl=60*5)
+def get_usdsek():
+    return get.usdsek()
+
+def default_bet_size(row):
+    return row['allocated_payout'] if 'allocated_payout' in row else row['max_target_payout']
+
+@st.cache_data(max_entries=64)
+def size_category(version, cat, balances, usdsek, _snapshot):
+    # memoized per snapshot version, so each category is only sized once per snapshot
+    price = _snapshot.price[cat]
+    not_started = _snapshot.info.loc[_snapshot.info['state']=='NOT_STARTED'].index
+    price = price.loc[(price['margin'] >= -0.02) & price['game_id'].isin(not_started)]
+    sized = sizing.size_opportunities(
+        cat=cat,
+        price=price,
+        volume_index=_snapshot.volume_index,
+        balances=balances,
+        usdsek=usdsek
+    )
+    sized = sized.dropna(subset=['max_target_payout']).sort_values('margin',ascending=False)
+    # marginal margin at every size across all providers' prices, shown under each card
+    steps = sizing.ladder_steps(cat, sized, _snapshot.ladder[cat], balances, usdsek)
+    return sizing.with_depth(sized, steps), steps
+
+@st.cache_data(max_entries=64)
+def allocate_slate(version, balances, usdsek, _snapshot):
+    # every category shares the same limits, so the allocation needs all of them sized
+    sized = {cat: size_category(version, cat, balances, usdsek, _snapshot)[0] for cat in _snapshot.price}
+    return allocation.allocate(sized, balances, usdsek)
+
+def render(sport:str):
+    # the whole arbitrage page of one sport, every sport's page script only calls this
+    os.environ['PHANTOM_PRIVATE_KEY'] = st.secrets['PHANTOM_PRIVATE_KEY']
+    os.environ['POLYMARKET_PUBLIC_KEY'] = st.secrets['POLYMARKET_PUBLIC_KEY']
+
+    st.set_page_config(
+        page_title='Arbitrage',
+        page_icon=':heavy_dollar_sign:',
+        layout='wide',
+        # initial_sidebar_state="collapsed"
+    )
+
+    col1,col2 = st.columns([1,1])
+
+    selected_providers = col1.pills(
+        key="selected_providers",
+        label="Select Providers",
+        options=arbitrage.PROVIDER_INFO.keys(),
+        default=arbitrage.PROVIDER_INFO.keys(),
+        selection_mode="multi"
+    )
+
+    provider_info = {k: v for k, v in arbitrage.PROVIDER_INFO.items() if k in selected_providers}
+
+    feed = get_price_feed(sport=sport)
+
+    if st.button('Update Odds'):
+        feed.refresh(providers=selected_providers)
+
+    usdsek = get_usdsek()
+    usdsek = col2.number_input(
+        label='USD/SEK',
+        value=usdsek,
+        step=0.01,
+        key='USDSEK'
+    )
+
+    compact_view = col2.toggle(
+        label='Compact View',
+        value=True,
+        key='compact_view'
+    )
+
+    # off by default, sharing the limits needs every category sized and not only the selected one
+    share_balances = col2.toggle(
+        label='Share Balances',
+        value=False,
+        key='share_balances',
+        help='Split each provider limit across all opportunities instead of offering all of it to every one. Sizes every category on each new snapshot.'
+    )
+
+    snapshot = feed.snapshot(providers=selected_providers)
+    if snapshot is None:
+        st.error(f'Could not fetch prices from: {", ".join(selected_providers)}')
+        st.stop()
+
+    # (cat, game_id, line) -> traceback of cards that failed to render, kept across reruns for the diagnostics panel
+    card_errors = st.session_state.setdefault('card_errors', {})
+
+    # (cat, game_id, line) -> (basis, bet size) for bet sizes the user typed, basis being the snapshot version and
+    # default bet size at the time, so an edit is dropped once new prices, limits or the allocation change the default
+    bet_edits = st.session_state.setdefault('bet_edits', {})
+
+    @st.fragment(run_every=10)
+    def snapshot_status(version):
+        # the only automatic full-page rerun: when the feed has published newer prices
+        latest = feed.snapshot(providers=selected_providers, wait=False)
+        if latest is not None and latest.version != version:
+            st.rerun()
+        st.caption(
+            f'Prices from {time.strftime("%H:%M:%S", time.localtime(snapshot.fetched_at))} '
+            f'({snapshot.age:.0f}s old){", refreshing..." if feed.is_refreshing(selected_providers) else ""}'
+        )
+        # providers that timed out or failed are left out, or served from their last good quotes
+        missing = [provider for provider in selected_providers if provider not in snapshot.providers]
+        failing = [provider for provider in selected_providers if provider in feed.errors and provider in snapshot.providers]
+        if missing:
+            st.warning(f'No prices from: {", ".join(missing)}')
+        if failing:
+            st.caption(f'Last refresh failed, showing older prices from: {", ".join(failing)}')
+
+        with st.expander('Diagnostics'):
+            # last fetch of every selected provider, requests and bytes are only seen on the feed's session
+            stats = [asdict(feed.provider_stats[provider]) for provider in selected_providers if provider in feed.provider_stats]
+            if stats:
+                stats = pd.DataFrame(stats)
+                st.caption(f'Connections: {stats["reused_connections"].sum()} reused / {stats["new_connections"].sum()} new')
+                st.dataframe(stats.drop(columns=['sport']), hide_index=True)
+            for provider in selected_providers:
+                error = feed.errors.get(provider) # updated by the feed thread, read it once
+                if error is not None:
+                    st.write(f'{provider}:')
+                    st.code(error)
+            for (cat_, game_id, line), error in card_errors.items():
+                st.write(f'Card {cat_} {game_id} ({line}) failed to render:')
+                st.code(error)
+
+    snapshot_status(snapshot.version)
+
+    info = snapshot.info
+    price_dict = snapshot.price
+
+    cols = st.columns(len(st.session_state['selected_providers']))
+
+    for idx, provider in enumerate(st.session_state['selected_providers']):
+        if provider in ['polymarket','polymarket_v2']:
+            provider_info[provider]['balance'] = cols[idx].number_input(
+                label=f'{provider} Limit (USD)',
+                value=provider_info[provider]['balance'],
+                min_value=0.,
+                max_value=100_000.,
+                step=10.,
+                key=f'{provider}_limit'
+            )
+        else:
+            provider_info[provider]['balance'] = cols[idx].number_input(
+                label=f'{provider} Limit (SEK)',
+                value=provider_info[provider]['balance'],
+                min_value=0.,
+                max_value=1_000_000.,
+                step=100.,
+                key=f'{provider}_limit'
+            )
+
+    balances = {provider: provider_info[provider]['balance'] for provider in provider_info}
+
+    def team_names(cat, game_ids):
+        if cat == 'total': # UNDER = VISITOR, OVER = HOME
+            return ['Under']*len(game_ids), ['Over']*len(game_ids)
+        teams = info.reindex(game_ids)
+        return list(teams['visitor_team']), list(teams['home_team'])
+
+    def bet_size(row_key, default):
+        basis, value = bet_edits.get(row_key, (None, None))
+        return value if basis == (snapshot.version, default) else default
+
+    def record_bet_size(row_key, default, key):
+        bet_edits[row_key] = ((snapshot.version, default), st.session_state[key])
+
+    def reset_bet_size(row_key):
+        bet_edits.pop(row_key, None)
+
+    def render_card(cat, i, row):
+
+        margin = row['margin']*100
+        line = row['line']
+
+        (visitor_team,),(home_team,) = team_names(cat, [i])
+        visitor_provider,home_provider = row['visitor_provider'],row['home_provider']
+        visitor_price,home_price = row['visitor_price'],row['home_price']
+
+        if cat == 'total':
+            st.header(f'{i}:   {visitor_team} @ {home_team} - Total: {line}')
+        else:
+            st.header(f'{i}:   {visitor_team} @ {home_team}')
+        st.subheader(f'Start Time: {info.loc[i]["swe_time"]}')
+
+        col1,col2,col3,col4,col5 = st.columns([2,1,2,2,1])
+        col1.header(f'{margin:.2f}%')
+
+        # edits are shared with the compact table through bet_edits, the widget follows them and the default
+        default = default_bet_size(row)
+        row_key = (cat, i, line) # the same game and line can be offered in several categories
+        key = f'bet_size_{cat}_{i}_{line}'
+        st.session_state[key] = bet_size(row_key, default)
+        target_payout = col1.number_input(
+            label='Bet Size',
+            min_value=0.,
+            step=100.,
+            key=key,
+            on_change=record_bet_size,
+            args=(row_key, default, key)
+        )
+
+        if row_key in bet_edits:
+            col1.button(
+                label=f'Reset Bet Size ({default:.2f})',
+                key=f'reset_bet_size_{cat}_{i}_{line}',
+                on_click=reset_bet_size,
+                args=(row_key,),
+                help='Back to the largest bet size the limits allow' + (', shared across all opportunities' if 'allocated_payout' in row else '')
+            )
+
+        margin_split = col2.radio(
+            label='Margin Split',
+            options=sizing.MARGIN_SPLITS,
+            key=f'margin_split_{cat}_{i}_{line}'
+        )
+
+        stakes = sizing.row_stakes(row, margin_split, target_payout)
+        visitor_stake_sek,home_stake_sek = stakes['visitor_stake_sek'],stakes['home_stake_sek']
+        visitor_payout_sek,home_payout_sek = stakes['visitor_payout_sek'],stakes['home_payout_sek']
+
+        visitor_url = provider_info[visitor_provider]['url'][sport]
+        home_url = provider_info[home_provider]['url'][sport]
+
+        col1.write(f'(Actual Stake: {stakes["actual_stake_sek"]:.2f} SEK)')
+
+        # how old each leg's quote is now, the card can sit on screen long after the fetch
+        visitor_age, home_age = time.time() - row['visitor_fetched_at'], time.time() - row['home_fetched_at']
+        col5.caption(f'Quote age: {visitor_age:.0f}s / {home_age:.0f}s')
+        if max(visitor_age, home_age) > MAX_QUOTE_AGE:
+            col5.warning('Stale quotes')
+
+        # VISITOR INFO
+        if cat == 'spread':
+            col3.subheader(f'{visitor_team} {row["visitor_line"]} ({visitor_provider})')
+        else:
+            col3.subheader(f'{visitor_team} ({visitor_provider})')
+        if row['visitor_ccy'] == 'USD':
+            col3.subheader(f'Bet Size: {visitor_stake_sek/usdsek:.2f} USD ({visitor_stake_sek:.2f} SEK)')
+        else:
+            col3.subheader(f'Bet Size: {visitor_stake_sek:.2f} SEK')
+        col3.subheader(f'Price/Odds: {visitor_price:.3f} / {(1./visitor_price):.3f}')
+        if row['visitor_ccy'] == 'USD':
+            col3.subheader(f'Payout: {visitor_payout_sek/usdsek:.2f} USD ({visitor_payout_sek:.2f} SEK)')
+        else:
+            col3.subheader(f'Payout: {visitor_payout_sek:.2f} SEK')
+        col3.subheader(f'Profit: {stakes["visitor_profit_sek"]:.2f} SEK ({stakes["visitor_profit_percentage"]:.2f}%)')
+        col3.write(f'Visitor URL: [{visitor_provider}]({visitor_url})')
+
+        # HOME INFO
+        if cat == 'spread':
+            col4.subheader(f'{home_team} {row["home_line"]} ({home_provider})')
+        else:
+            col4.subheader(f'{home_team} ({home_provider})')
+        if row['home_ccy'] == 'USD':
+            col4.subheader(f'Bet Size: {home_stake_sek/usdsek:.2f} USD ({home_stake_sek:.2f} SEK)')
+        else:
+            col4.subheader(f'Bet Size: {home_stake_sek:.2f}')
+        col4.subheader(f'Price/Odds: {home_price:.3f} / {(1./home_price):.3f}')
+        if row['home_ccy'] == 'USD':
+            col4.subheader(f'Payout: {home_payout_sek/usdsek:.2f} USD ({home_payout_sek:.2f} SEK)')
+        else:
+            col4.subheader(f'Payout: {home_payout_sek:.2f} SEK')
+        col4.subheader(f'Profit: {stakes["home_profit_sek"]:.2f} SEK ({stakes["home_profit_percentage"]:.2f}%)')
+        col4.write(f'Home URL: [{home_provider}]({home_url})')
+
+        # the whole ladder, how the margin falls as the size reaches into worse prices and other providers
+        depth = steps.loc[(steps['game_id'] == i) & (steps['line'] == line)]
+        if len(depth) > 1:
+            with st.expander(f'Depth: {row["depth_profit_sek"]:.2f} SEK profit at {row["depth_stake_sek"]:.2f} SEK stake'):
+                st.dataframe(
+                    depth.drop(columns=['opportunity','game_id','line']).assign(
+                        marginal_margin=depth['marginal_margin']*100,
+                        margin=depth['margin']*100,
+                    ),
+                    hide_index=True,
+                    column_config={
+                        'payout': st.column_config.NumberColumn('Payout (SEK)', format='%.2f'),
+                        'visitor_price': st.column_config.NumberColumn('Visitor Price', format='%.3f'),
+                        'home_price': st.column_config.NumberColumn('Home Price', format='%.3f'),
+                        'marginal_margin': st.column_config.NumberColumn('Marginal Margin', format='%.2f%%'),
+                        'visitor_vwap': st.column_config.NumberColumn('Visitor VWAP', format='%.3f'),
+                        'home_vwap': st.column_config.NumberColumn('Home VWAP', format='%.3f'),
+                        'margin': st.column_config.NumberColumn('Margin', format='%.2f%%'),
+                        'stake_sek': st.column_config.NumberColumn('Stake (SEK)', format='%.2f'),
+                        'profit_sek': st.column_config.NumberColumn('Profit (SEK)', format='%.2f'),
+                    }
+                )
+
+    def apply_table_edits(cat, editor_key, row_keys, defaults):
+        # move edited cells into bet_edits and the card widget keys, then reset the editor so it shows recomputed stakes
+        for pos, changes in st.session_state[editor_key]['edited_rows'].items():
+            _, i, line = row_key = row_keys[pos]
+            if changes.get('bet_size') is not None:
+                bet_edits[row_key] = ((snapshot.version, defaults[pos]), changes['bet_size'])
+            if changes.get('margin_split') is not None:
+                st.session_state[f'margin_split_{cat}_{i}_{line}'] = changes['margin_split']
+        st.session_state[f'{cat}_editor_version'] = st.session_state.get(f'{cat}_editor_version', 0) + 1
+
+    @st.fragment
+    def card_fragment(cat, i, row):
+        # editing a card reruns only this card
+        try:
+            render_card(cat, i, row)
+            card_errors.pop((cat, i, row['line']), None)
+        except Exception:
+            card_errors[(cat, i, row['line'])] = traceback.format_exc() # shown under Diagnostics
+
+        st.divider()
+
+    @st.fragment
+    def render_table(cat, sized):
+
+        if sized.empty:
+            st.info('No opportunities')
+            return
+
+        row_keys = [(cat, i, line) for i, line in zip(sized.index, sized['line'])]
+        default_payout = list(sized['allocated_payout'] if 'allocated_payout' in sized else sized['max_target_payout'])
+        target_payout = [bet_size(row_key, default) for row_key, default in zip(row_keys, default_payout)]
+        margin_split = [st.session_state.get(f'margin_split_{cat}_{i}_{line}', 'split') for _, i, line in row_keys]
+        stakes = sizing.compute_stakes(
+            target_payout=target_payout,
+            visitor_price=sized['visitor_price'].values,
+            home_price=sized['home_price'].values,
+            limiting_side=sized['limiting_side'].values,
+            margin_split=margin_split
+        )
+        visitor_team,home_team = team_names(cat, sized.index)
+
+        table = pd.DataFrame({
+            'game_id': sized.index,
+            'game': [f'{v} @ {h}' for v, h in zip(visitor_team, home_team)],
+            'start_time': info.reindex(sized.index)['swe_time'].values,
+            'line': sized['line'].values,
+            'margin': sized['margin'].values*100,
+            'visitor': [f'{t} ({p})' for t, p in zip(visitor_team, sized['visitor_provider'])],
+            'visitor_price': sized['visitor_price'].values,
+            'home': [f'{t} ({p})' for t, p in zip(home_team, sized['home_provider'])],
+            'home_price': sized['home_price'].values,
+            'bet_size': target_payout,
+            'allocated_payout': sized['allocated_payout'].values if 'allocated_payout' in sized else np.nan,
+            'margin_split': margin_split,
+            'visitor_stake_sek': stakes['visitor_stake_sek'],
+            'home_stake_sek': stakes['home_stake_sek'],
+            'actual_stake_sek': stakes['actual_stake_sek'],
+            'visitor_profit_sek': stakes['visitor_profit_sek'],
+            'home_profit_sek': stakes['home_profit_sek'],
+            'depth_stake_sek': sized['depth_stake_sek'].values,
+            'depth_profit_sek': sized['depth_profit_sek'].values,
+            'quote_age': time.time() - np.minimum(sized['visitor_fetched_at'].values, sized['home_fetched_at'].values),
+        })
+
+        editor_key = f'{cat}_table_{st.session_state.get(f"{cat}_editor_version", 0)}'
+        st.data_editor(
+            table,
+            key=editor_key,
+            hide_index=True,
+            use_container_width=True,
+            disabled=[c for c in table.columns if c not in ['bet_size','margin_split']],
+            column_config={
+                'margin': st.column_config.NumberColumn('Margin', format='%.2f%%'),
+                'visitor_price': st.column_config.NumberColumn('Visitor Price', format='%.3f'),
+                'home_price': st.column_config.NumberColumn('Home Price', format='%.3f'),
+                'bet_size': st.column_config.NumberColumn('Bet Size', min_value=0., step=100., format='%.2f'),
+                'allocated_payout': st.column_config.NumberColumn('Allocated', format='%.2f', help='Bet size with the limits shared across all opportunities'),
+                'margin_split': st.column_config.SelectboxColumn('Margin Split', options=sizing.MARGIN_SPLITS, required=True),
+                'visitor_stake_sek': st.column_config.NumberColumn('Visitor Stake (SEK)', format='%.2f'),
+                'home_stake_sek': st.column_config.NumberColumn('Home Stake (SEK)', format='%.2f'),
+                'actual_stake_sek': st.column_config.NumberColumn('Actual Stake (SEK)', format='%.2f'),
+                'visitor_profit_sek': st.column_config.NumberColumn('Visitor Profit (SEK)', format='%.2f'),
+                'home_profit_sek': st.column_config.NumberColumn('Home Profit (SEK)', format='%.2f'),
+                'depth_stake_sek': st.column_config.NumberColumn('Depth Stake (SEK)', format='%.2f', help='Most profitable stake across every provider\'s prices'),
+                'depth_profit_sek': st.column_config.NumberColumn('Depth Profit (SEK)', format='%.2f'),
+                'quote_age': st.column_config.NumberColumn('Quote Age (s)', format='%.0f', help=f'Older leg, stale above {MAX_QUOTE_AGE:.0f}s'),
+            },
+            on_change=apply_table_edits,
+            args=(cat, editor_key, row_keys, default_payout)
+        )
+
+        # selected by opportunity rather than position, so a new snapshot keeps showing the same one (or none)
+        labels = {(cat_, i, line): f'{i}: {game} ({line})' for (cat_, i, line), game in zip(row_keys, table['game'])}
+        detail = st.selectbox(
+            label='Details',
+            options=row_keys,
+            format_func=labels.get,
+            index=None,
+            key=f'{cat}_detail'
+        )
+        if detail is not None:
+            pos = row_keys.index(detail)
+            render_card(cat, sized.index[pos], sized.iloc[pos])
+
+    # only the selected category is computed and rendered, st.tabs would run every tab on each rerun
+    categories = list(price_dict.keys())
+    cat = st.segmented_control(
+        key='category',
+        label='Category',
+        options=categories,
+        default=categories[0] if categories else None,
+        selection_mode='single'
+    ) or (categories[0] if categories else None)
+
+    if cat is not None:
+
+        sized, steps = size_category(
+            version=snapshot.version,
+            cat=cat,
+            balances=balances,
+            usdsek=usdsek,
+            _snapshot=snapshot
+        )
+
+        if share_balances:
+            allocated = allocate_slate(
+                version=snapshot.version,
+                balances=balances,
+                usdsek=usdsek,
+                _snapshot=snapshot
+            )
+            cat_allocated = allocated.opportunities.loc[allocated.opportunities['cat'] == cat]
+            sized = sized.assign(allocated_payout=cat_allocated['payout'].values)
+            st.caption(
+                f'Limits shared across all opportunities: {allocated.opportunities["stake_sek"].sum():.2f} SEK staked '
+                f'for {allocated.profit_sek:.2f} SEK guaranteed profit (at most {allocated.gap*100:.1f}% below the best possible)'
+            )
+            with st.expander('Provider Usage'):
+                st.dataframe(allocated.providers, column_config={
+                    'balance_sek': st.column_config.NumberColumn('Limit (SEK)', format='%.2f'),
+                    'used_sek': st.column_config.NumberColumn('Allocated (SEK)', format='%.2f'),
+                })
+
+        # st.write(sized)
+
+        unknown_volume = sizing.count_unknown_volume(sized)
+        if unknown_volume:
+            st.caption(f'No volume known for {unknown_volume} sides, limited by balance only')
+
+        if compact_view:
+            render_table(cat, sized)
+        else:
+            for i,row in sized.iterrows():
+                card_fragment(cat, i, row)
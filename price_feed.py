@@ -0,0 +1,389 @@
+import asyncio
+import atexit
+import json
+import threading
+import time
+import traceback
+from dataclasses import asdict, dataclass
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+from cutgems_utils.get.arbitrage import arbitrage
+
+import sizing
+from scan_context import ScanContext, ScanStats, accepts_session, track
+
+DEFAULT_TTL = 60.*5.
+DEFAULT_TIMEOUT = 30. # per provider fetch
+
+# columns identifying one priced market per category
+PRICE_KEYS = {
+    'moneyline': ['game_id'],
+    'spread': ['game_id', 'spread_visitor', 'spread_home'],
+    'total': ['game_id', 'total'],
+}
+
+
+@dataclass(frozen=True)
+class ProviderQuotes:
+    """One provider's `combine_sportbooks_prices` result. Treat the frames as read-only."""
+    sport: str
+    provider: str
+    version: int
+    fetched_at: float
+    info: pd.DataFrame
+    price: MappingProxyType
+    volume: MappingProxyType
+    volume_index: pd.Series
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Prices combined across a provider selection. Treat the frames as read-only."""
+    sport: str
+    version: tuple # ((provider, provider version), ...)
+    fetched_at: float # oldest provider fetch
+    providers: tuple
+    info: pd.DataFrame
+    price: MappingProxyType
+    volume: MappingProxyType
+    volume_index: pd.Series
+    ladder: MappingProxyType # cat -> `sizing.build_ladder` across the providers
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+@dataclass(frozen=True)
+class ProviderStats:
+    """
+    What one provider fetch cost and returned. Requests, connections and bytes are only
+    seen on the shared session, connections reused from earlier fetches show the pooling works.
+    """
+    sport: str
+    provider: str
+    started: float
+    duration: float
+    requests: int
+    new_connections: int
+    reused_connections: int
+    bytes_received: int
+    latency_p50: float # per request, seconds
+    latency_p90: float
+    latency_max: float
+    request_errors: dict # exception type -> count
+    error: str = None # exception type of the fetch, None if it succeeded
+    games: int = 0
+    lines: int = 0 # priced markets across categories
+
+    @classmethod
+    def from_fetch(cls, sport:str, provider:str, stats:ScanStats, quotes:ProviderQuotes=None, error:BaseException=None):
+        return cls(
+            sport=sport,
+            provider=provider,
+            started=stats.started,
+            duration=stats.duration,
+            requests=stats.requests,
+            new_connections=stats.new_connections,
+            reused_connections=stats.reused_connections,
+            bytes_received=stats.bytes_received,
+            latency_p50=stats.latency_percentile(50),
+            latency_p90=stats.latency_percentile(90),
+            latency_max=stats.latency_percentile(100),
+            request_errors=dict(stats.request_errors),
+            error=type(error).__name__ if error is not None else None,
+            games=len(quotes.info) if quotes is not None else 0,
+            lines=sum(len(price) for price in quotes.price.values()) if quotes is not None else 0,
+        )
+
+    def log_line(self):
+        """One JSON log line, NaN latencies (no requests seen) as null."""
+        record = {key: (None if value != value else value) for key, value in asdict(self).items()}
+        return json.dumps({'event': 'provider_fetch', **record})
+
+
+def _frame(df:pd.DataFrame):
+    return df.reset_index(drop=df.index.name != 'game_id')
+
+
+def _combine_price(cat:str, frames:list, fetched_at:list):
+    """Best price, provider and fetch time per side across single-provider price frames."""
+    keys = PRICE_KEYS[cat]
+    visitor_side, home_side = sizing.SIDES[cat]
+    fields = {'price': 'price', 'provider': 'price_provider', 'fetched_at': 'fetched_at'}
+
+    # one long frame of every side's quote, built column by column rather than frame by frame
+    sides = [(_frame(price), side, fetched_at_) for price, fetched_at_ in zip(frames, fetched_at) for side in (visitor_side, home_side)]
+    lengths = [len(price) for price, _, _ in sides]
+    long = pd.DataFrame({
+        **{key: pd.concat([price[key] for price, _, _ in sides], ignore_index=True) for key in keys},
+        'side': np.repeat([side for _, side, _ in sides], lengths),
+        'provider': pd.concat([price[f'best_{cat}_{side}_price_provider'] for price, side, _ in sides], ignore_index=True),
+        'price': pd.concat([price[f'best_{cat}_{side}_price'] for price, side, _ in sides], ignore_index=True).astype(float),
+        'fetched_at': np.repeat([fetched_at_ for _, _, fetched_at_ in sides], lengths),
+    })
+    long = long.dropna(subset=['price'])
+    if long.empty:
+        columns = keys + [f'best_{cat}_{side}_{field}' for side in (visitor_side, home_side) for field in fields.values()]
+        return pd.DataFrame(columns=columns + ['margin'])
+    best = long.loc[long.groupby(keys + ['side'])['price'].idxmin()]
+    best = best.set_index(keys + ['side'])[list(fields)].unstack('side')
+    best.columns = [f'best_{cat}_{side}_{fields[field]}' for field, side in best.columns]
+    for side in (visitor_side, home_side):
+        for field in fields.values():
+            if f'best_{cat}_{side}_{field}' not in best.columns:
+                best[f'best_{cat}_{side}_{field}'] = float('nan')
+
+    # prices are implied probabilities, the margin is what is left of 1 after backing both sides
+    best['margin'] = 1. - (best[f'best_{cat}_{visitor_side}_price'] + best[f'best_{cat}_{home_side}_price'])
+    return best.reset_index()
+
+
+def combine_quotes(quotes:list, ladder:bool=True):
+    """
+    Combine single-provider quotes into `combine_sportbooks_prices`-shaped frames.
+
+    Returns a dict with 'info', 'price', 'volume', 'volume_index' and 'ladder', where the
+    price frames hold the best price, provider and fetch time (`best_{cat}_{side}_fetched_at`)
+    per side across `quotes` and the margin, and the ladders every provider's price per side.
+    Without `ladder` the ladders are left out (empty), for callers that only need the best prices.
+    """
+    if not quotes:
+        return {'info': pd.DataFrame(), 'price': {}, 'volume': {}, 'volume_index': sizing.build_volume_index({}), 'ladder': {}}
+
+    info = pd.concat([q.info for q in quotes])
+    info = info.loc[~info.index.duplicated()]
+
+    cats = [cat for cat in PRICE_KEYS if any(cat in q.price for q in quotes)]
+    price = {
+        cat: _combine_price(cat, [q.price[cat] for q in quotes if cat in q.price], [q.fetched_at for q in quotes if cat in q.price])
+        for cat in cats
+    }
+    volume = {
+        cat: pd.concat([_frame(q.volume[cat]) for q in quotes if cat in q.volume], ignore_index=True)
+        for cat in cats
+    }
+    volume_index = pd.concat([q.volume_index for q in quotes])
+    ladder = {
+        cat: sizing.build_ladder(cat, [q.price[cat] for q in quotes if cat in q.price], volume_index)
+        for cat in cats
+    } if ladder else {}
+
+    return {'info': info, 'price': price, 'volume': volume, 'volume_index': volume_index, 'ladder': ladder}
+
+
+async def fetch_provider(sport:str, provider:str, provider_info:dict, overrides:dict=None, version:int=1, session=None):
+    """Fetch one provider's quotes with `combine_sportbooks_prices`."""
+    fetched_at = time.time()
+    kwargs = {'session': session} if session is not None and accepts_session(arbitrage.combine_sportbooks_prices) else {}
+    data = await arbitrage.combine_sportbooks_prices(
+        sport=sport,
+        overrides=overrides or {},
+        provider_info={provider: provider_info[provider]},
+        **kwargs
+    )
+    return ProviderQuotes(
+        sport=sport,
+        provider=provider,
+        version=version,
+        fetched_at=fetched_at,
+        info=data['info'],
+        price=MappingProxyType(dict(data['price'])),
+        volume=MappingProxyType(dict(data['volume'])),
+        volume_index=sizing.build_volume_index(data['volume']),
+    )
+
+
+async def fetch_quotes(sport:str, provider_info:dict, overrides:dict=None, timeout:float=DEFAULT_TIMEOUT, session=None):
+    """
+    Fetch every provider concurrently, each with its own `timeout`.
+
+    Returns the quotes of the providers that answered in time, a dict of the missing
+    ones, provider -> reason, so one slow sportsbook does not discard the others, and
+    the `ProviderStats` of every provider.
+    """
+    async def fetch(provider):
+        stats = ScanStats(started=time.time())
+        with track(stats):
+            try:
+                quotes = await asyncio.wait_for(
+                    fetch_provider(sport, provider, provider_info, overrides, session=session),
+                    timeout=timeout
+                )
+                return quotes, stats, None
+            except Exception as e:
+                return None, stats, e
+            finally:
+                stats.duration = time.time() - stats.started
+
+    providers = list(provider_info)
+    results = await asyncio.gather(*[fetch(provider) for provider in providers])
+
+    quotes, missing, stats = [], {}, {}
+    for provider, (provider_quotes, provider_stats, error) in zip(providers, results):
+        stats[provider] = ProviderStats.from_fetch(sport, provider, provider_stats, provider_quotes, error)
+        if isinstance(error, asyncio.TimeoutError):
+            missing[provider] = f'timed out after {timeout:g}s'
+        elif error is not None:
+            missing[provider] = f'{type(error).__name__}: {error}'
+        else:
+            quotes.append(provider_quotes)
+    return quotes, missing, stats
+
+
+class PriceFeed:
+    """
+    Background price refresher for one sport, cached per provider.
+
+    Every provider is fetched on its own schedule (`ttl` seconds, default 5 minutes) and
+    with its own `timeout` on a dedicated thread and event loop, through one `ScanContext`
+    so connections stay warm. `snapshot(providers)` combines the latest quotes of
+    any selection without fetching, so toggling providers reuses work already done. Only
+    the very first read of a provider waits for its fetch. Every fetch is handed to
+    `archive` (an `archive.SnapshotArchive`) when given. `close` stops the feed and its
+    connections, it runs at interpreter exit once the feed is started.
+    """
+
+    def __init__(self, sport:str, provider_info:dict, overrides:dict=None, ttl:dict=None, timeout:float=DEFAULT_TIMEOUT, archive=None):
+        self.sport = sport
+        self.provider_info = provider_info
+        self.overrides = overrides or {}
+        self.timeout = timeout
+        self.archive = archive
+        self.ttl = {provider: (ttl or {}).get(provider, DEFAULT_TTL) for provider in provider_info}
+        self.errors = {}
+        self.provider_stats = {} # provider -> ProviderStats of its last fetch
+
+        self._scan_context = ScanContext()
+        self._refreshing = set()
+        self._quotes = {}
+        self._versions = {provider: 0 for provider in provider_info}
+        self._first = {provider: threading.Event() for provider in provider_info}
+        self._wake = {provider: asyncio.Event() for provider in provider_info}
+        self._combined = {}
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._task = None
+        self._thread = threading.Thread(target=self._run, name=f'price-feed-{sport}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def close(self, timeout:float=10.):
+        """Stop refreshing and close the feed's connections."""
+        if not self._thread.is_alive():
+            return
+
+        async def stop():
+            await self._scan_context.close()
+            if self._task is not None:
+                self._task.cancel()
+
+        asyncio.run_coroutine_threadsafe(stop(), self._loop).result(timeout)
+        self._thread.join(timeout)
+
+    def snapshot(self, providers, wait:bool=True, timeout:float=None):
+        """Latest prices combined across `providers`, or None if none of them has quotes yet."""
+        providers = tuple(sorted(p for p in providers if p in self.provider_info))
+        if wait:
+            deadline = None if timeout is None else time.time() + timeout
+            for provider in providers:
+                remaining = None if deadline is None else max(deadline - time.time(), 0.)
+                self._first[provider].wait(remaining)
+
+        quotes = [self._quotes[p] for p in providers if p in self._quotes]
+        if not quotes:
+            return None
+
+        version = tuple((q.provider, q.version) for q in quotes)
+        with self._lock:
+            snapshot = self._combined.get(version)
+        if snapshot is not None:
+            return snapshot
+
+        data = combine_quotes(quotes)
+        snapshot = Snapshot(
+            sport=self.sport,
+            version=version,
+            fetched_at=min(q.fetched_at for q in quotes),
+            providers=tuple(q.provider for q in quotes),
+            info=data['info'],
+            price=MappingProxyType(data['price']),
+            volume=MappingProxyType(data['volume']),
+            volume_index=data['volume_index'],
+            ladder=MappingProxyType(data['ladder']),
+        )
+        with self._lock:
+            if len(self._combined) >= 32:
+                self._combined.pop(next(iter(self._combined)))
+            self._combined[version] = snapshot
+        return snapshot
+
+    def is_refreshing(self, providers):
+        return any(provider in self._refreshing for provider in providers)
+
+    def refresh(self, providers=None):
+        """Ask for a refresh now, current quotes keep being served meanwhile."""
+        for provider in providers or self.provider_info:
+            if provider in self._wake:
+                self._loop.call_soon_threadsafe(self._wake[provider].set)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._task = self._loop.create_task(self._refresh_all())
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError: # closed
+            pass
+
+    async def _refresh_all(self):
+        await asyncio.gather(*[self._refresh_forever(provider) for provider in self.provider_info])
+
+    async def _refresh_forever(self, provider:str):
+        while True:
+            await self._refresh(provider)
+            self._wake[provider].clear()
+            try:
+                await asyncio.wait_for(self._wake[provider].wait(), timeout=self.ttl[provider])
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refresh(self, provider:str):
+        self._refreshing.add(provider)
+        stats = ScanStats(started=time.time()) # also counts a failed fetch, which returns no stats of its own
+        try:
+            with track(stats):
+                try:
+                    quotes, _ = await self._scan_context.scan(
+                        fetch_provider,
+                        sport=self.sport,
+                        provider=provider,
+                        provider_info=self.provider_info,
+                        overrides=self.overrides,
+                        version=self._versions[provider] + 1,
+                        timeout=self.timeout
+                    )
+                finally:
+                    stats.duration = time.time() - stats.started
+            self.provider_stats[provider] = ProviderStats.from_fetch(self.sport, provider, stats, quotes)
+            self._versions[provider] = quotes.version
+            self._quotes[provider] = quotes
+            self.errors.pop(provider, None)
+            if self.archive is not None:
+                self.archive.submit(quotes)
+        except asyncio.TimeoutError as e:
+            self.provider_stats[provider] = ProviderStats.from_fetch(self.sport, provider, stats, error=e)
+            self.errors[provider] = f'timed out after {self.timeout:g}s'
+            print(f'ERROR: {self.sport} prices from {provider} timed out')
+        except Exception as e:
+            self.provider_stats[provider] = ProviderStats.from_fetch(self.sport, provider, stats, error=e)
+            self.errors[provider] = traceback.format_exc()
+            print(f'ERROR: Failed to refresh {self.sport} prices from {provider}')
+            traceback.print_exc()
+        finally:
+            self._refreshing.discard(provider)
+            self._first[provider].set()
@@ -0,0 +1,408 @@
+import asyncio
+import json
+import math
+import random
+import time
+import traceback
+from dataclasses import asdict, dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+import price_feed
+import sizing
+
+@dataclass(frozen=True)
+class Quote:
+    """
+    One provider's price for one side of a market, `price` NaN when the quote was withdrawn.
+
+    Markets are keyed like the opportunity table: (game_id, cat, line) with line 0 for
+    moneyline, the home spread for spread and the total for total.
+    """
+    game_id: str
+    cat: str
+    line: float
+    side: str
+    provider: str
+    price: float
+    volume: float = math.nan
+    at: float = 0. # when the quote was fetched or received
+
+    @property
+    def market(self):
+        return (self.game_id, self.cat, self.line)
+
+
+def _same(a:Quote, b:Quote):
+    """Whether two quotes of the same key have the same price and volume."""
+    return a.price == b.price and (a.volume == b.volume or (np.isnan(a.volume) and np.isnan(b.volume)))
+
+
+@dataclass(frozen=True)
+class ArbEvent:
+    kind: str # 'open', 'update' or 'close'
+    game_id: str
+    cat: str
+    line: float
+    margin: float
+    visitor_provider: str
+    visitor_price: float
+    visitor_volume: float
+    home_provider: str
+    home_price: float
+    home_volume: float
+    quote_at: float # the quote that triggered the event
+    emitted_at: float
+    visitor_at: float = math.nan # when the quote of each side was fetched
+    home_at: float = math.nan
+
+    @property
+    def latency(self):
+        return self.emitted_at - self.quote_at
+
+
+class QuoteStore:
+    """
+    In-memory book of the latest quote per (game_id, cat, line, side, provider).
+
+    `apply` takes a batch of quote updates, re-evaluates only the markets they touched
+    and returns the arbitrage events they caused: 'open' when a market's margin reaches
+    `bound`, 'update' when the best price or provider of an open one changes and 'close'
+    when its margin drops below `bound` or a side has no quote left. A quote with the same
+    price and volume as the one it replaces only refreshes its `at`, so polled providers
+    can re-confirm their quotes without re-evaluating anything. Not thread-safe, apply
+    updates from one thread or event loop.
+    """
+
+    def __init__(self, bound:float=.0, clock=time.time):
+        self.bound = bound
+        self.clock = clock
+        self._books = {} # (game_id, cat, line) -> {side -> {provider -> Quote}}
+        self._open = {} # (game_id, cat, line) -> last ArbEvent
+
+    def __len__(self):
+        return sum(len(quotes) for book in self._books.values() for quotes in book.values())
+
+    @property
+    def open(self):
+        return dict(self._open)
+
+    def apply(self, quotes):
+        touched = {}
+        for quote in quotes:
+            book = self._books.setdefault(quote.market, {})
+            side = book.setdefault(quote.side, {})
+            previous = side.get(quote.provider)
+            if np.isnan(quote.price):
+                side.pop(quote.provider, None)
+            else:
+                side[quote.provider] = quote
+                if previous is not None and _same(previous, quote):
+                    self._refresh(quote)
+                    continue
+            touched[quote.market] = max(touched.get(quote.market, 0.), quote.at)
+
+        events = []
+        for market, quote_at in touched.items():
+            event = self._evaluate(market, quote_at)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def remove_provider(self, provider:str, at:float=None):
+        """Withdraw every quote of `provider`, e.g. when it stopped answering."""
+        at = self.clock() if at is None else at
+        return self.apply([
+            Quote(*market, side, provider, math.nan, at=at)
+            for market, book in self._books.items()
+            for side, quotes in book.items() if provider in quotes
+        ])
+
+    def _refresh(self, quote:Quote):
+        # a re-confirmed quote leaves the market as it is, but an open arbitrage using it is as fresh as the quote
+        event = self._open.get(quote.market)
+        if event is None:
+            return
+        key = 'visitor' if quote.side == sizing.SIDES[quote.cat][0] else 'home'
+        if getattr(event, f'{key}_provider') == quote.provider:
+            self._open[quote.market] = replace(event, **{f'{key}_at': quote.at})
+
+    def _best(self, market):
+        cat = market[1]
+        book = self._books.get(market, {})
+        best = []
+        for side in sizing.SIDES[cat]:
+            quotes = book.get(side)
+            if not quotes:
+                return None
+            best.append(min(quotes.values(), key=lambda quote: quote.price))
+        return best
+
+    def _evaluate(self, market, quote_at:float):
+        previous = self._open.get(market)
+        best = self._best(market)
+        margin = 1. - (best[0].price + best[1].price) if best is not None else math.nan
+
+        if best is None or not margin >= self.bound:
+            if not any(self._books.get(market, {}).values()):
+                self._books.pop(market, None)
+            if previous is None:
+                return None
+            del self._open[market]
+            return ArbEvent(**{
+                **asdict(previous), 'kind': 'close', 'margin': margin, 'quote_at': quote_at, 'emitted_at': self.clock()
+            })
+
+        visitor, home = best
+        if previous is not None and all(
+                a == b or (a != a and b != b) # NaN volumes compare equal
+                for a, b in zip(
+                    (visitor.provider, visitor.price, visitor.volume, home.provider, home.price, home.volume),
+                    (previous.visitor_provider, previous.visitor_price, previous.visitor_volume,
+                     previous.home_provider, previous.home_price, previous.home_volume),
+                )
+            ):
+            return None
+
+        event = ArbEvent(
+            kind='open' if previous is None else 'update',
+            game_id=market[0],
+            cat=market[1],
+            line=market[2],
+            margin=margin,
+            visitor_provider=visitor.provider,
+            visitor_price=visitor.price,
+            visitor_volume=visitor.volume,
+            home_provider=home.provider,
+            home_price=home.price,
+            home_volume=home.volume,
+            quote_at=quote_at,
+            emitted_at=self.clock(),
+            visitor_at=visitor.at,
+            home_at=home.at,
+        )
+        self._open[market] = event
+        return event
+
+
+def quotes_from_provider(quotes:price_feed.ProviderQuotes):
+    """Every priced quote in a `price_feed.ProviderQuotes`, keyed by market line like the opportunity table."""
+    result = []
+    for cat, price in quotes.price.items():
+        if cat not in sizing.SIDES:
+            continue
+        price = price_feed._frame(price)
+        if cat == 'spread':
+            line = price[f'{cat}_home'].astype(float).to_numpy()
+        elif cat == 'total':
+            line = price[cat].astype(float).to_numpy()
+        else:
+            line = np.zeros(len(price))
+
+        for side in sizing.SIDES[cat]:
+            side_price = price[f'best_{cat}_{side}_price'].astype(float).to_numpy()
+            line_col = sizing.line_column(cat, side)
+            side_line = price[line_col].astype(float).to_numpy() if line_col else 0.
+            side_volume = sizing.lookup_volume(
+                quotes.volume_index, price['game_id'], cat, side_line, side, np.full(len(price), quotes.provider, dtype=object)
+            )
+            for game_id, line_, price_, volume in zip(price['game_id'].astype(str), line, side_price, side_volume):
+                if not np.isnan(price_):
+                    result.append(Quote(game_id, cat, float(line_), side, quotes.provider, float(price_), float(volume), quotes.fetched_at))
+    return result
+
+
+def diff_quotes(previous:list, current:list, at:float=None, refresh:bool=False):
+    """
+    The updates turning `previous` into `current` (lists of one provider's `Quote`s).
+
+    Changed and new quotes are returned as is, quotes missing from `current` are withdrawn.
+    With `refresh` the unchanged quotes are returned too, so a `QuoteStore` knows they
+    were fetched again (it only updates their `at`).
+    """
+    def key(quote):
+        return (quote.market, quote.side, quote.provider)
+
+    old = {key(quote): quote for quote in previous}
+    new = {key(quote): quote for quote in current}
+    at = max((quote.at for quote in current), default=time.time()) if at is None else at
+
+    updates = [quote for k, quote in new.items() if refresh or k not in old or not _same(old[k], quote)]
+    updates += [Quote(*k[0], k[1], k[2], math.nan, at=at) for k in old if k not in new]
+    return updates
+
+
+def event_data(events, info:pd.DataFrame):
+    """
+    The open arbitrages of `events` as `price_feed.combine_quotes`-shaped data, so they are
+    sized and tabled by `opportunities.from_prices` like scanned ones. `info` is the game
+    info of the providers (teams, start time, state).
+    """
+    price, volume = {}, []
+    for cat, (visitor_side, home_side) in sizing.SIDES.items():
+        cat_events = [event for event in events if event.cat == cat and event.kind != 'close']
+        if not cat_events:
+            continue
+        line = np.array([event.line for event in cat_events], dtype=float)
+        frame = pd.DataFrame({'game_id': [event.game_id for event in cat_events]})
+        if cat == 'spread': # markets are keyed by the home spread
+            frame['spread_visitor'], frame['spread_home'] = -line, line
+        elif cat == 'total':
+            frame['total'] = line
+        for key, side in [('visitor', visitor_side), ('home', home_side)]:
+            frame[f'best_{cat}_{side}_price'] = [getattr(event, f'{key}_price') for event in cat_events]
+            frame[f'best_{cat}_{side}_price_provider'] = [getattr(event, f'{key}_provider') for event in cat_events]
+            frame[f'best_{cat}_{side}_fetched_at'] = [getattr(event, f'{key}_at') for event in cat_events]
+            line_col = sizing.line_column(cat, side)
+            volume.append(pd.DataFrame({
+                'game_id': frame['game_id'],
+                'cat': cat,
+                'line': frame[line_col].astype(float) if line_col else 0.,
+                'side': side,
+                'provider': frame[f'best_{cat}_{side}_price_provider'],
+                'volume': [getattr(event, f'{key}_volume') for event in cat_events],
+            }))
+        frame['margin'] = [event.margin for event in cat_events]
+        price[cat] = frame
+
+    volume_index = (
+        pd.concat(volume, ignore_index=True).dropna(subset=['volume']).drop_duplicates(sizing.VOLUME_KEYS).set_index(sizing.VOLUME_KEYS)['volume']
+        if volume else sizing.build_volume_index({})
+    )
+    return {'info': info, 'price': price, 'volume': {}, 'volume_index': volume_index}
+
+
+async def poll_provider(
+        sport:str,
+        provider:str,
+        provider_info:dict,
+        interval:float,
+        overrides:dict=None,
+        scan_context=None,
+        on_fetch=None,
+        max_failures:int=2,
+    ):
+    """
+    Adapter for the request/response providers: fetch `provider` every `interval` seconds
+    and yield the quotes that changed since the previous fetch, along with the unchanged
+    ones so the store knows when they were last fetched. After `max_failures` failed
+    fetches in a row every quote of the provider is withdrawn, until a fetch succeeds
+    again. `on_fetch(quotes)` is called with every full `price_feed.ProviderQuotes`,
+    e.g. to keep its game info.
+    """
+    previous, version, failures = [], 0, 0
+    while True:
+        started = time.time()
+        updates = []
+        try:
+            version += 1
+            kwargs = dict(sport=sport, provider=provider, provider_info=provider_info, overrides=overrides, version=version)
+            if scan_context is not None:
+                quotes, _ = await scan_context.scan(price_feed.fetch_provider, timeout=price_feed.DEFAULT_TIMEOUT, **kwargs)
+            else:
+                quotes = await asyncio.wait_for(price_feed.fetch_provider(**kwargs), price_feed.DEFAULT_TIMEOUT)
+            if on_fetch is not None:
+                on_fetch(quotes)
+            current = quotes_from_provider(quotes)
+            updates = diff_quotes(previous, current, refresh=True)
+            previous, failures = current, 0
+        except Exception:
+            failures += 1
+            print(f'ERROR: Failed to poll {sport} quotes from {provider} ({failures} in a row)')
+            traceback.print_exc()
+            if failures >= max_failures and previous:
+                # a provider that stopped answering must not keep its markets open
+                print(f'{sport}: withdrawing the quotes of {provider}')
+                updates = diff_quotes(previous, [], at=time.time())
+                previous = []
+        if updates:
+            yield updates
+        await asyncio.sleep(max(interval - (time.time() - started), 0.))
+
+
+def write_quotes(path:str, batches):
+    """Record batches of quotes as JSON lines (one batch per line) for `replay_feed`."""
+    with open(path, 'w') as f:
+        for batch in batches:
+            f.write(json.dumps([asdict(quote) for quote in batch]) + '\n')
+
+
+def read_quotes(path:str):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield [Quote(**{**quote, 'price': float(quote['price'] if quote['price'] is not None else math.nan)}) for quote in json.loads(line)]
+
+
+async def replay_feed(batches, speed:float=None):
+    """
+    Yield recorded batches of quotes, keeping the recorded gaps between them divided by
+    `speed` (None replays as fast as possible). Quote times are kept as recorded.
+    """
+    last = None
+    for batch in batches:
+        at = max((quote.at for quote in batch), default=last)
+        if speed is not None and last is not None and at is not None:
+            await asyncio.sleep(max(at - last, 0.) / speed)
+        last = at
+        yield batch
+
+
+async def mock_feed(
+        games:int=10,
+        providers=('betfair', 'pinnacle', 'polymarket'),
+        updates:int=1000,
+        batch_size:int=5,
+        interval:float=0.,
+        seed:int=None,
+    ):
+    """
+    Random-walk moneyline quotes around a fair price for testing the streaming mode.
+
+    Every provider starts quoting every game with a vig of a few percent, then single
+    quotes move by up to a point (occasionally crossing into an arbitrage) or get
+    withdrawn, `batch_size` per batch.
+    """
+    rng = random.Random(seed)
+    fair = {str(game): rng.uniform(.3, .7) for game in range(games)}
+    book = {}
+    for game_id, p in fair.items():
+        for provider in providers:
+            vig = rng.uniform(.01, .04) / 2.
+            book[(game_id, 'visitor', provider)] = p + vig
+            book[(game_id, 'home', provider)] = 1. - p + vig
+
+    now = time.time()
+    yield [Quote(game_id, 'moneyline', 0., side, provider, price, at=now) for (game_id, side, provider), price in book.items()]
+
+    keys = list(book)
+    for _ in range(updates // batch_size):
+        if interval:
+            await asyncio.sleep(interval)
+        now = time.time()
+        batch = []
+        for game_id, side, provider in rng.sample(keys, min(batch_size, len(keys))):
+            if rng.random() < .02:
+                price = math.nan
+            else:
+                price = min(max(book[(game_id, side, provider)] + rng.uniform(-.01, .01), .01), .99)
+                book[(game_id, side, provider)] = price
+            batch.append(Quote(game_id, 'moneyline', 0., side, provider, price, at=now))
+        yield batch
+
+
+async def run_stream(store:QuoteStore, feeds, on_events=None):
+    """
+    Drive `store` from async feeds of quote batches concurrently (provider adapters,
+    `replay_feed`, `mock_feed`), calling `on_events(events)` with the arbitrage events of
+    every batch that caused any, so they can be handled together. Returns when every feed
+    is exhausted.
+    """
+    async def consume(feed):
+        async for batch in feed:
+            events = store.apply(batch)
+            if events and on_events is not None:
+                on_events(events)
+
+    await asyncio.gather(*[consume(feed) for feed in feeds])
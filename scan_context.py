@@ -0,0 +1,130 @@
+import asyncio
+import contextlib
+import contextvars
+import inspect
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+import aiohttp
+
+_current_stats = contextvars.ContextVar('scan_stats', default=()) # every ScanStats tracking this task
+
+
+@dataclass
+class ScanStats:
+    started: float = 0.
+    duration: float = 0.
+    requests: int = 0
+    new_connections: int = 0
+    reused_connections: int = 0
+    bytes_received: int = 0
+    request_latencies: list = field(default_factory=list) # seconds, failed requests included
+    request_errors: dict = field(default_factory=dict) # exception type -> count
+
+    def latency_percentile(self, q:float):
+        return float(np.percentile(self.request_latencies, q)) if self.request_latencies else float('nan')
+
+
+@contextlib.contextmanager
+def track(stats:ScanStats):
+    """Count the requests made in this block (and the tasks it starts) in `stats` too."""
+    token = _current_stats.set(_current_stats.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+async def _on_request_start(session, ctx, params):
+    ctx.started = time.perf_counter()
+    for stats in _current_stats.get():
+        stats.requests += 1
+
+
+async def _on_request_end(session, ctx, params):
+    for stats in _current_stats.get():
+        stats.request_latencies.append(time.perf_counter() - ctx.started)
+
+
+async def _on_request_exception(session, ctx, params):
+    error = type(params.exception).__name__
+    for stats in _current_stats.get():
+        stats.request_latencies.append(time.perf_counter() - ctx.started)
+        stats.request_errors[error] = stats.request_errors.get(error, 0) + 1
+
+
+async def _on_response_chunk_received(session, ctx, params):
+    for stats in _current_stats.get():
+        stats.bytes_received += len(params.chunk)
+
+
+async def _on_connection_create_end(session, ctx, params):
+    for stats in _current_stats.get():
+        stats.new_connections += 1
+
+
+async def _on_connection_reuseconn(session, ctx, params):
+    for stats in _current_stats.get():
+        stats.reused_connections += 1
+
+
+def accepts_session(func):
+    try:
+        return 'session' in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+class ScanContext:
+    """
+    Long-lived scanning context owning a pooled aiohttp session.
+
+    Create it once per event loop (the Streamlit price feed thread, the bot's loop) and run
+    every scan through `scan`, so connections and TLS sessions stay warm between scans.
+    The session is handed to the scan function as `session=` when its signature accepts
+    one. Each scan returns `ScanStats` with its requests, their latencies, errors and bytes
+    received, and how many connections were opened or reused.
+    """
+
+    def __init__(self, limit:int=100, keepalive_timeout:float=60.):
+        self.limit = limit
+        self.keepalive_timeout = keepalive_timeout
+        self.session = None
+
+    def _open(self):
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(_on_request_start)
+        trace_config.on_request_end.append(_on_request_end)
+        trace_config.on_request_exception.append(_on_request_exception)
+        trace_config.on_response_chunk_received.append(_on_response_chunk_received)
+        trace_config.on_connection_create_end.append(_on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.limit,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            ),
+            trace_configs=[trace_config]
+        )
+
+    async def scan(self, func, timeout:float=None, **kwargs):
+        """Await `func(**kwargs)` using the pooled session (within `timeout` seconds if given), returns (result, ScanStats)."""
+        if self.session is None or self.session.closed:
+            self._open()
+        if accepts_session(func):
+            kwargs.setdefault('session', self.session)
+
+        stats = ScanStats(started=time.time())
+        with track(stats):
+            try:
+                return await asyncio.wait_for(func(**kwargs), timeout), stats
+            finally:
+                stats.duration = time.time() - stats.started
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+
+import metrics
+from scan_context import ScanContext
+
+LOOP_LAG_SECONDS = metrics.Histogram(
+    'event_loop_lag_seconds', 'How late the event loop woke up from a sleep.',
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1., 5.)
+)
+
+
+class ScanWorker:
+    """
+    Runs scans on a dedicated thread with its own event loop.
+
+    Fetching and the pandas work of a scan happen on the worker thread, the caller's loop
+    (the Discord gateway) only awaits the finished result. Cancelling the awaiting task
+    cancels the scan on the worker.
+    """
+
+    def __init__(self, name:str='scan-worker'):
+        self.context = ScanContext() # its session is opened on the worker loop
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def close(self, timeout:float=10.):
+        """Close the pooled connections and stop the worker loop, call it once the scans are done."""
+        if self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.context.close(), self._loop).result(timeout)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def submit(self, coro):
+        """Run a long-lived coroutine on the worker, returns a `concurrent.futures.Future`."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def scan(self, func, **kwargs):
+        """Await `func(**kwargs)` on the worker, returns (result, ScanStats)."""
+        future = asyncio.run_coroutine_threadsafe(self.context.scan(func, **kwargs), self._loop)
+        return await asyncio.wrap_future(future)
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes up from a sleep of `interval` seconds.
+
+    Lags above `warn_after` are printed right away, and the max and mean lag are printed
+    every `report_every` seconds.
+    """
+
+    def __init__(self, interval:float=1., warn_after:float=.25, report_every:float=60.*5.):
+        self.interval = interval
+        self.warn_after = warn_after
+        self.report_every = report_every
+        self.max_lag = 0.
+        self.total_lag = 0.
+        self.samples = 0
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_report = loop.time()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - started - self.interval
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+            self.samples += 1
+            LOOP_LAG_SECONDS.observe(lag)
+
+            if lag > self.warn_after:
+                print(f'WARNING: event loop lag {lag*1000:.0f} ms')
+
+            if loop.time() - last_report >= self.report_every:
+                print(f'event loop lag, max: {self.max_lag*1000:.0f} ms, mean: {self.total_lag/self.samples*1000:.1f} ms')
+                self.max_lag, self.total_lag, self.samples = 0., 0., 0
+                last_report = loop.time()
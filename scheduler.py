@@ -0,0 +1,96 @@
+import asyncio
+import traceback
+from dataclasses import dataclass
+
+import metrics
+
+SKIPPED_TICKS = metrics.Counter('scan_skipped_ticks_total', 'Scan ticks skipped because the previous scan overran.', ['name'])
+
+
+@dataclass
+class SchedulerStats:
+    scans: int = 0
+    skipped_ticks: int = 0
+    last_duration: float = 0.
+    max_duration: float = 0.
+    total_duration: float = 0.
+
+    @property
+    def mean_duration(self):
+        return self.total_duration / self.scans if self.scans else 0.
+
+
+class AdaptiveScheduler:
+    """
+    Runs one sport's scans back to back, picking each delay from the slate.
+
+    `scan` is an async callable returning `(minutes_to_next_start, found)` or None when the
+    scan failed, `found` being whether the scan turned up a new opportunity. Scans run every
+    `min_interval` seconds while a game starts within `near_start` minutes and for `hot_for`
+    seconds after a new opportunity appeared, every `max_interval` seconds when nothing is
+    scheduled and every `base_interval` otherwise.
+    A scan never starts before the previous one finished; ticks that passed while a scan
+    overran its delay are counted as skipped.
+    """
+
+    def __init__(
+            self,
+            name:str,
+            base_interval:float,
+            min_interval:float=60.,
+            max_interval:float=60.*15.,
+            near_start:float=30.,
+            hot_for:float=60.*15.,
+        ):
+        self.name = name
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval, base_interval)
+        self.max_interval = max(max_interval, base_interval)
+        self.near_start = near_start
+        self.hot_for = hot_for
+        self.stats = SchedulerStats()
+        self._last_found = None
+        self._task = None
+
+    def next_delay(self, minutes_to_next_start:float, found:bool, now:float):
+        if found:
+            self._last_found = now
+        if self._last_found is not None and now - self._last_found < self.hot_for:
+            return self.min_interval
+        if minutes_to_next_start is None:
+            return self.max_interval
+        if minutes_to_next_start <= self.near_start:
+            return self.min_interval
+        return self.base_interval
+
+    def start(self, scan):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(scan))
+
+    async def _run(self, scan):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                result = await scan()
+            except Exception:
+                traceback.print_exc()
+                result = None
+            duration = loop.time() - started
+
+            self.stats.scans += 1
+            self.stats.last_duration = duration
+            self.stats.max_duration = max(self.stats.max_duration, duration)
+            self.stats.total_duration += duration
+
+            delay = self.next_delay(*result, now=loop.time()) if result is not None else self.base_interval
+            wait = delay - duration
+            if wait < 0.:
+                skipped = 1 + int(-wait // delay)
+                self.stats.skipped_ticks += skipped
+                SKIPPED_TICKS.inc(skipped, name=self.name)
+                print(f'{self.name} scan took {duration:.1f}s, longer than its {delay:.0f}s interval, {skipped} ticks skipped')
+                wait = 0.
+            else:
+                print(f'{self.name} scan took {duration:.1f}s, next in {wait:.0f}s')
+            await asyncio.sleep(wait)
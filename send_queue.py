@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+import discord
+
+import metrics
+
+MAX_EMBEDS = 10 # per Discord message
+MAX_EMBED_CHARS = 6000 # combined text of all embeds of one message
+
+ALERTS_SENT = metrics.Counter('discord_alerts_sent_total', 'Alerts delivered to Discord, per embed.', ['kind'])
+ALERTS_FAILED = metrics.Counter('discord_alerts_failed_total', 'Alerts Discord refused or that failed to send, per embed.', ['kind', 'error'])
+RATE_LIMITED = metrics.Counter('discord_rate_limited_total', 'Sends put back in the queue after a rate limit.')
+SEND_SECONDS = metrics.Histogram('discord_send_seconds', 'Duration of Discord send and edit requests.', ['kind'])
+FETCH_TO_POST_SECONDS = metrics.Histogram(
+    'discord_fetch_to_post_seconds', 'Age of the older quote of an alert when Discord accepted it.', ['kind'],
+    buckets=(1., 2.5, 5., 10., 20., 30., 60., 120., 300., 600.)
+)
+
+
+def embeds_length(embeds:list):
+    return sum(len(embed) for embed in embeds)
+
+
+def moved_embed(embed:discord.Embed):
+    # stands in for an alert that no longer fits its message
+    return discord.Embed(title=embed.title, description='Updated in a newer message.', color=discord.Color.light_grey())
+
+
+class Post:
+    """A sent message and the embeds it holds, shared by the alerts batched into it."""
+
+    def __init__(self, message:discord.Message, embeds:list):
+        self.message = message
+        self.embeds = embeds
+        self.dirty = False
+
+
+class SendQueue:
+    """
+    Outbound Discord queue drained by a dedicated sender task.
+
+    Scans hand alerts over with `post`/`edit` and return immediately. The sender always
+    takes the most profitable item first, packs up to 10 new alerts for the same channel
+    into one message, within Discord's 6000 character limit for the embeds of a message,
+    and sends one request at a time. An edit that would push its message over the limit
+    moves the alert to a new message instead. When discord.py reports a rate limit
+    (`discord.RateLimited`, see the bot's `max_ratelimit_timeout`) it waits `retry_after`
+    and the item goes back in the queue, so more valuable alerts can overtake it.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._ready = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def _push(self, kind:str, profit:float, channel, alert, post:Post=None):
+        heapq.heappush(self._heap, (-profit, next(self._counter), kind, channel, alert, post))
+        self._ready.set()
+
+    def post(self, channel, alert, profit:float):
+        """Send `alert.embed` as a new message."""
+        self._push('post', profit, channel, alert)
+
+    def edit(self, alert, profit:float):
+        """Update the message holding `alert` with its current embed. Pending alerts need no edit."""
+        post = alert.post
+        post.embeds[alert.index] = alert.embed
+        if embeds_length(post.embeds) > MAX_EMBED_CHARS:
+            post.embeds[alert.index] = moved_embed(alert.embed)
+            alert.post, alert.index = None, None
+            self.post(post.message.channel, alert, profit)
+        if not post.dirty:
+            post.dirty = True
+            self._push('edit', profit, post.message.channel, alert, post)
+
+    def _pop_batch(self, channel, length:int):
+        # highest priority new alerts for the same channel that still fit, everything else stays queued
+        batch, skipped = [], []
+        while self._heap and len(batch) < MAX_EMBEDS - 1:
+            item = heapq.heappop(self._heap)
+            fits = length + len(item[4].embed) <= MAX_EMBED_CHARS
+            if item[2] == 'post' and item[3] == channel and not item[4].cancelled and fits:
+                batch.append(item)
+                length += len(item[4].embed)
+            else:
+                skipped.append(item)
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        return batch
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            item = heapq.heappop(self._heap)
+            _, _, kind, channel, alert, post = item
+            if alert.cancelled and kind == 'post':
+                continue
+
+            batch = [item] + (self._pop_batch(channel, len(alert.embed)) if kind == 'post' else [])
+            started = time.perf_counter()
+            try:
+                if kind == 'post':
+                    embeds = [i[4].embed for i in batch]
+                    message = await channel.send(embeds=embeds)
+                    post = Post(message, embeds)
+                    for index, i in enumerate(batch):
+                        i[4].post, i[4].index = post, index
+                else:
+                    post.dirty = False
+                    post.message = await post.message.edit(embeds=post.embeds)
+                SEND_SECONDS.observe(time.perf_counter() - started, kind=kind)
+                ALERTS_SENT.inc(len(batch), kind=kind)
+                for i in batch:
+                    if i[4].fetched_at is not None:
+                        FETCH_TO_POST_SECONDS.observe(time.time() - i[4].fetched_at, kind=kind)
+            except discord.RateLimited as e:
+                RATE_LIMITED.inc()
+                print(f'rate limited, retrying in {e.retry_after:.1f}s')
+                for i in batch:
+                    heapq.heappush(self._heap, i)
+                if kind == 'edit':
+                    post.dirty = True
+                await asyncio.sleep(e.retry_after)
+            except discord.errors.Forbidden as e:
+                print(f'ERROR: Bot does not have permission to send messages in #{channel.name}')
+                self._failed(kind, batch, e)
+            except Exception as e:
+                print(f'ERROR: Failed to send message: {str(e)}')
+                self._failed(kind, batch, e)
+
+    def _failed(self, kind:str, batch:list, error:Exception):
+        ALERTS_FAILED.inc(len(batch), kind=kind, error=type(error).__name__)
+        # alerts that never made it out are posted again by the next scan that finds them
+        if kind == 'post':
+            for i in batch:
+                i[4].cancelled = True
@@ -0,0 +1,390 @@
+import numpy as np
+import pandas as pd
+
+USD_PROVIDERS = ['polymarket', 'polymarket_v2']
+MARGIN_SPLITS = ['split', 'visitor', 'home']
+
+# (visitor, home) side names per category, for totals UNDER = VISITOR and OVER = HOME
+SIDES = {
+    'moneyline': ('visitor', 'home'),
+    'spread': ('visitor', 'home'),
+    'total': ('under', 'over'),
+}
+
+VOLUME_KEYS = ['game_id', 'cat', 'line', 'side', 'provider']
+LADDER_COLUMNS = VOLUME_KEYS + ['price', 'volume']
+
+# ladder step column -> column added by `with_depth`
+DEPTH_FIELDS = {
+    'payout': 'depth_target_payout',
+    'stake_sek': 'depth_stake_sek',
+    'profit_sek': 'depth_profit_sek',
+    'margin': 'depth_margin',
+    'visitor_vwap': 'depth_visitor_vwap',
+    'home_vwap': 'depth_home_vwap',
+}
+
+STAKE_FIELDS = [
+    'visitor_stake_sek',
+    'home_stake_sek',
+    'actual_stake_sek',
+    'visitor_payout_sek',
+    'home_payout_sek',
+    'visitor_profit_sek',
+    'home_profit_sek',
+    'visitor_profit_percentage',
+    'home_profit_percentage',
+]
+
+
+def line_column(cat:str, side:str):
+    """Column in the price/volume frames holding the line a side is quoted at."""
+    if cat == 'spread':
+        return f'{cat}_{side}'
+    if cat == 'total':
+        return cat
+    return None
+
+
+def _unwrap(value):
+    return value.item() if np.ndim(value) == 0 else value
+
+
+def compute_stakes(target_payout, visitor_price, home_price, limiting_side, margin_split):
+    """
+    Stakes, payouts and profits in SEK for a target payout.
+
+    Works element-wise, so every argument can be a scalar or an array of the same length.
+    The limiting side is staked to pay out `target_payout`, the other side is sized by
+    `margin_split`: 'split' spreads the profit evenly, 'visitor'/'home' puts all of it
+    on that side and lets the other one break even.
+    """
+    target_payout = np.asarray(target_payout, dtype=float)
+    visitor_price = np.asarray(visitor_price, dtype=float)
+    home_price = np.asarray(home_price, dtype=float)
+    visitor_limits = np.asarray(limiting_side) == 'visitor'
+    margin_split = np.asarray(margin_split)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        visitor_stake_sek = np.where(
+            visitor_limits,
+            target_payout*visitor_price,
+            np.select(
+                [margin_split == 'split', margin_split == 'visitor'],
+                [target_payout*visitor_price, target_payout*(1-home_price)],
+                target_payout*home_price/((1./visitor_price)-1), # home break even
+            )
+        )
+        home_stake_sek = np.where(
+            visitor_limits,
+            np.select(
+                [margin_split == 'split', margin_split == 'home'],
+                [target_payout*home_price, target_payout*(1-visitor_price)],
+                target_payout*visitor_price/((1./home_price)-1), # visitor break even
+            ),
+            target_payout*home_price
+        )
+
+        actual_stake_sek = visitor_stake_sek + home_stake_sek
+
+        visitor_payout_sek = visitor_stake_sek*(1./visitor_price)
+        home_payout_sek = home_stake_sek*(1./home_price)
+
+        visitor_profit_sek = visitor_payout_sek - actual_stake_sek
+        home_profit_sek = home_payout_sek - actual_stake_sek
+
+        visitor_profit_percentage = (visitor_profit_sek/actual_stake_sek)*100
+        home_profit_percentage = (home_profit_sek/actual_stake_sek)*100
+
+    return {
+        'visitor_stake_sek': _unwrap(visitor_stake_sek),
+        'home_stake_sek': _unwrap(home_stake_sek),
+        'actual_stake_sek': _unwrap(actual_stake_sek),
+        'visitor_payout_sek': _unwrap(visitor_payout_sek),
+        'home_payout_sek': _unwrap(home_payout_sek),
+        'visitor_profit_sek': _unwrap(visitor_profit_sek),
+        'home_profit_sek': _unwrap(home_profit_sek),
+        'visitor_profit_percentage': _unwrap(visitor_profit_percentage),
+        'home_profit_percentage': _unwrap(home_profit_percentage),
+    }
+
+
+def build_volume_index(volume_dict:dict):
+    """
+    Index every known volume from `combine_sportbooks_prices` by (game_id, cat, line, side, provider).
+
+    Built once per fetch so each limit lookup is a hash lookup instead of scanning the
+    volume frames. Missing and NaN volumes are left out of the index.
+    """
+    game_ids, cats, lines, sides, providers, volumes = [], [], [], [], [], []
+    for cat, volume in volume_dict.items():
+        volume = volume.reset_index(drop=volume.index.name != 'game_id')
+        for side in SIDES.get(cat, ()):
+            suffix = f'_{cat}_{side}_volume'
+            line_col = line_column(cat, side)
+            line = volume[line_col].to_numpy(dtype=float) if line_col else np.zeros(len(volume))
+            # one block per provider column, in column order like a melt of the frame
+            for column in [c for c in volume.columns if c.endswith(suffix)]:
+                game_ids.append(volume['game_id'].to_numpy(dtype=object))
+                lines.append(line)
+                volumes.append(pd.to_numeric(volume[column], errors='coerce').to_numpy(dtype=float))
+                cats.append(cat)
+                sides.append(side)
+                providers.append(column[:-len(suffix)])
+
+    if not volumes:
+        return pd.Series(
+            [], dtype=float, name='volume',
+            index=pd.MultiIndex.from_arrays([[]]*len(VOLUME_KEYS), names=VOLUME_KEYS)
+        )
+
+    lengths = [len(block) for block in volumes]
+    index = pd.DataFrame({
+        'game_id': np.concatenate(game_ids),
+        'cat': np.repeat(np.array(cats, dtype=object), lengths),
+        'line': np.concatenate(lines),
+        'side': np.repeat(np.array(sides, dtype=object), lengths),
+        'provider': np.repeat(np.array(providers, dtype=object), lengths),
+        'volume': np.concatenate(volumes),
+    })
+    index = index.loc[~np.isnan(index['volume'].to_numpy())]
+    index = index.drop_duplicates(VOLUME_KEYS) # first match, like .iloc[0]
+    return index.set_index(VOLUME_KEYS)['volume']
+
+
+def lookup_volume(volume_index:pd.Series, game_id, cat:str, line, side:str, provider):
+    """Volumes for arrays of keys, NaN where no volume is known."""
+    n = len(game_id)
+    keys = pd.MultiIndex.from_arrays([
+        np.asarray(game_id),
+        np.full(n, cat, dtype=object),
+        np.broadcast_to(np.asarray(line, dtype=float), n),
+        np.full(n, side, dtype=object),
+        np.asarray(provider),
+    ], names=VOLUME_KEYS)
+    return volume_index.reindex(keys).to_numpy(dtype=float)
+
+
+def build_ladder(cat:str, frames:list, volume_index:pd.Series):
+    """
+    Price ladder of every side of `cat` across single-provider price frames.
+
+    One level per provider quoting a side, with the columns of `LADDER_COLUMNS` and the
+    volume from `volume_index` (NaN when unknown). The cheapest level is the one
+    `size_opportunities` sizes against, the others are the depth behind it. Deeper levels
+    of one provider can be added as more rows with the same keys.
+    """
+    parts = []
+    for side in SIDES[cat]:
+        line_col = line_column(cat, side)
+        levels = []
+        for price in frames:
+            price = price.reset_index(drop=price.index.name != 'game_id')
+            levels.append(pd.DataFrame({
+                'game_id': price['game_id'],
+                'line': price[line_col].astype(float) if line_col else 0.,
+                'provider': price[f'best_{cat}_{side}_price_provider'],
+                'price': price[f'best_{cat}_{side}_price'].astype(float),
+            }))
+        if not levels:
+            continue
+        levels = pd.concat(levels, ignore_index=True).dropna(subset=['price'])
+        levels['cat'] = cat
+        levels['side'] = side
+        levels['volume'] = lookup_volume(volume_index, levels['game_id'], cat, levels['line'].values, side, levels['provider'])
+        parts.append(levels)
+
+    if not parts:
+        return pd.DataFrame(columns=LADDER_COLUMNS)
+    return pd.concat(parts, ignore_index=True)[LADDER_COLUMNS]
+
+
+def ladder_steps(cat:str, sized:pd.DataFrame, ladder:pd.DataFrame, balances:dict, usdsek:float):
+    """
+    Marginal and volume-weighted prices at every size for the rows of `size_opportunities`.
+
+    Both sides are bought to the same payout, filling each side's `build_ladder` levels
+    cheapest first. A level holds what its volume allows (converted like in
+    `size_opportunities`) and is capped by what is left of its provider's balance.
+
+    Returns one row per opportunity and step, by increasing payout. `opportunity` is the
+    row's position in `sized`. Each row has the payout at the end of the step, the
+    provider and marginal price filling it per side and the step's `marginal_margin`. It
+    also has, for the whole payout, the cumulative VWAP per side, the average `margin`,
+    the total stake and the guaranteed profit. Marginal margins only decrease, so the
+    profit is largest at the end of the last step with a positive marginal margin.
+    """
+    columns = [
+        'opportunity', 'game_id', 'line', 'payout',
+        'visitor_provider', 'visitor_price', 'home_provider', 'home_price', 'marginal_margin',
+        'visitor_vwap', 'home_vwap', 'margin', 'stake_sek', 'profit_sek',
+    ]
+    visitor_side, home_side = SIDES[cat]
+
+    levels = []
+    for key, side in [('visitor', visitor_side), ('home', home_side)]:
+        keys = pd.DataFrame({
+            'opportunity': np.arange(len(sized)),
+            'game_id': sized.index.values,
+            'line': sized[f'{key}_line'].astype(float).values,
+        })
+        side_ladder = ladder.loc[(ladder['cat'] == cat) & (ladder['side'] == side), ['game_id', 'line', 'provider', 'price', 'volume']]
+        levels.append(keys.merge(side_ladder, on=['game_id', 'line']).assign(key=key))
+    levels = pd.concat(levels, ignore_index=True).sort_values(['opportunity', 'key', 'price'], kind='stable')
+
+    price = levels['price'].to_numpy(dtype=float)
+    is_usd = levels['provider'].isin(USD_PROVIDERS).to_numpy()
+    volume_limit = levels['volume'].to_numpy(dtype=float) * np.where(is_usd, usdsek, 1./price)
+    stake = np.where(np.isnan(volume_limit), np.inf, volume_limit * price)
+    balance = levels['provider'].map(balances).astype(float).to_numpy() * np.where(is_usd, usdsek, 1.)
+    balance = np.where(np.isnan(balance), np.inf, balance) # no balance known -> volume limit
+
+    # what the provider's cheaper levels of the same side already used of its balance
+    providers = ['opportunity', 'key', 'provider']
+    levels['used'] = pd.Series(stake, index=levels.index).groupby([levels[c] for c in providers], sort=False).cumsum()
+    used = levels.groupby(providers, sort=False)['used'].shift(fill_value=0.).to_numpy()
+    stake = np.clip(balance - used, 0., stake)
+    with np.errstate(invalid='ignore'):
+        levels['capacity'] = np.where(np.isfinite(stake), stake / price, np.nan) # payout, neither limit known -> unsized
+    levels = levels.loc[levels['capacity'] > 0.]
+    levels['cum'] = levels.groupby(['opportunity', 'key'], sort=False)['capacity'].cumsum()
+
+    # both sides are filled up to the shallower one, a step ends wherever either side moves to its next level
+    depth = levels.groupby(['opportunity', 'key'])['cum'].max().unstack('key').reindex(columns=['visitor', 'home']).min(axis=1, skipna=False).dropna()
+    if depth.empty:
+        return pd.DataFrame(columns=columns)
+    points = pd.concat([
+        levels.loc[levels['cum'] < levels['opportunity'].map(depth), ['opportunity', 'cum']],
+        pd.DataFrame({'opportunity': depth.index, 'cum': depth.values}),
+    ], ignore_index=True).drop_duplicates().sort_values('cum', kind='stable')
+
+    steps = points
+    for key in ('visitor', 'home'):
+        side_levels = levels.loc[levels['key'] == key, ['opportunity', 'cum', 'provider', 'price']].sort_values('cum', kind='stable')
+        steps = pd.merge_asof(
+            steps, side_levels.rename(columns={'provider': f'{key}_provider', 'price': f'{key}_price'}),
+            on='cum', by='opportunity', direction='forward'
+        )
+    steps = steps.sort_values(['opportunity', 'cum'], kind='stable').rename(columns={'cum': 'payout'}).reset_index(drop=True)
+
+    by_opportunity = steps.groupby('opportunity', sort=False)
+    size = steps['payout'] - by_opportunity['payout'].shift(fill_value=0.)
+    steps['marginal_margin'] = 1. - (steps['visitor_price'] + steps['home_price'])
+    for key in ('visitor', 'home'):
+        steps[f'{key}_vwap'] = (size * steps[f'{key}_price']).groupby(steps['opportunity'], sort=False).cumsum() / steps['payout']
+    steps['margin'] = 1. - (steps['visitor_vwap'] + steps['home_vwap'])
+    steps['stake_sek'] = steps['payout'] * (steps['visitor_vwap'] + steps['home_vwap'])
+    steps['profit_sek'] = steps['payout'] - steps['stake_sek']
+    steps['game_id'] = sized.index.values[steps['opportunity']]
+    steps['line'] = sized['line'].to_numpy()[steps['opportunity']]
+    return steps[columns]
+
+
+def with_depth(sized:pd.DataFrame, steps:pd.DataFrame):
+    """
+    `sized` with the most profitable size of its `ladder_steps` as the `DEPTH_FIELDS` columns.
+
+    That is the end of the last step with a positive marginal margin. Rows without one get
+    a zero payout, stake and profit.
+    """
+    sized = sized.copy()
+    best = steps.loc[steps['marginal_margin'] > 0.].groupby('opportunity', sort=False).tail(1)
+    best = best.set_index('opportunity').reindex(np.arange(len(sized)))
+    for field, column in DEPTH_FIELDS.items():
+        values = best[field].to_numpy(dtype=float)
+        sized[column] = np.nan_to_num(values) if field in ('payout', 'stake_sek', 'profit_sek') else values
+    return sized
+
+
+def size_opportunities(
+        cat:str,
+        price:pd.DataFrame,
+        volume_index:pd.Series,
+        balances:dict,
+        usdsek:float,
+        ladder:pd.DataFrame=None,
+    ):
+    """
+    Size every row of a `combine_sportbooks_prices` price frame in one pass.
+
+    `price` is the frame for `cat` (with a `game_id` column), `volume_index` comes from
+    `build_volume_index` and `balances` maps provider -> balance in the provider's currency
+    (USD for polymarket, SEK otherwise). Returns a frame indexed by game_id in the order of
+    `price` with the best provider, price, currency and fetch time (NaN when `price` has
+    none) per side, whether a volume was known for each side, the max target payout and
+    limiting side, and the stake fields of `compute_stakes` for every margin split as
+    `{field}_{margin_split}`. With a `ladder` (`build_ladder`), the best size across the
+    full depth is added as well, see `with_depth`.
+    """
+    price = price.reset_index(drop=price.index.name != 'game_id')
+    visitor_side, home_side = SIDES[cat]
+
+    # columns are collected and the frame built once, inserting them one by one is slow in a backtest
+    columns = {'game_id': price['game_id'], 'margin': price['margin'].to_numpy(dtype=float)}
+    if cat == 'spread':
+        columns['line'] = price[f'{cat}_home'].to_numpy(dtype=float)
+    elif cat == 'total':
+        columns['line'] = price[cat].to_numpy(dtype=float)
+    else:
+        columns['line'] = np.zeros(len(price))
+
+    for key, side in [('visitor', visitor_side), ('home', home_side)]:
+        provider = price[f'best_{cat}_{side}_price_provider']
+        side_price = price[f'best_{cat}_{side}_price'].to_numpy(dtype=float)
+        is_usd = provider.isin(USD_PROVIDERS).to_numpy()
+        line_col = line_column(cat, side)
+
+        side_line = price[line_col].to_numpy(dtype=float) if line_col else np.zeros(len(price))
+        side_volume = lookup_volume(volume_index, price['game_id'], cat, side_line, side, provider)
+
+        columns[f'{key}_line'] = side_line
+        columns[f'{key}_provider'] = provider
+        columns[f'{key}_price'] = side_price
+        columns[f'{key}_ccy'] = np.where(is_usd, 'USD', 'SEK')
+        fetched_at = f'best_{cat}_{side}_fetched_at'
+        columns[f'{key}_fetched_at'] = price[fetched_at].to_numpy(dtype=float) if fetched_at in price else np.full(len(price), np.nan)
+
+        # betfair volume is expressed in terms of available volume to bet while polymarket is expressed in terms of available volume to win (in USD)
+        balance_limit = provider.map(balances).to_numpy(dtype=float) * np.where(is_usd, usdsek, 1.) / side_price
+        volume_limit = side_volume * np.where(is_usd, usdsek, 1./side_price)
+        columns[f'{key}_volume_known'] = ~np.isnan(side_volume)
+        columns[f'max_{key}_target_sek'] = np.fmin(balance_limit, volume_limit) # no volume known -> balance limit
+
+    home_limits = columns['max_home_target_sek'] < columns['max_visitor_target_sek']
+    columns['limiting_side'] = np.where(home_limits, 'home', 'visitor')
+    columns['max_target_payout'] = np.where(home_limits, columns['max_home_target_sek'], columns['max_visitor_target_sek'])
+
+    for margin_split in MARGIN_SPLITS:
+        stakes = compute_stakes(
+            target_payout=columns['max_target_payout'],
+            visitor_price=columns['visitor_price'],
+            home_price=columns['home_price'],
+            limiting_side=columns['limiting_side'],
+            margin_split=margin_split,
+        )
+        for field, values in stakes.items():
+            columns[f'{field}_{margin_split}'] = values
+
+    sized = pd.DataFrame(columns, index=price.index)
+    sized = sized.set_index('game_id')
+    if ladder is not None:
+        sized = with_depth(sized, ladder_steps(cat, sized, ladder, balances, usdsek))
+    return sized
+
+
+def count_unknown_volume(sized:pd.DataFrame):
+    """Number of sides in a sized frame that were limited by balance only because no volume was known."""
+    return int((~sized['visitor_volume_known']).sum() + (~sized['home_volume_known']).sum())
+
+
+def row_stakes(row:pd.Series, margin_split:str, target_payout:float=None):
+    """Stake fields for one row of `size_opportunities`, recomputed if the bet size was edited."""
+    if target_payout is None or target_payout == row['max_target_payout']:
+        return {field: row[f'{field}_{margin_split}'] for field in STAKE_FIELDS}
+    return compute_stakes(
+        target_payout=target_payout,
+        visitor_price=row['visitor_price'],
+        home_price=row['home_price'],
+        limiting_side=row['limiting_side'],
+        margin_split=margin_split,
+    )
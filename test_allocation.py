@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+import allocation
+import sizing
+from test_sizing import USDSEK, slate
+
+
+@pytest.mark.parametrize('depth', [False, True])
+def test_allocate_stays_within_balances(depth):
+    balances = {'betfair': 1500., 'pinnacle': 900., 'polymarket': 60.}
+    sized, steps = {}, {}
+    for seed, cat in enumerate(['moneyline', 'total']):
+        price, volume, ladder = slate(cat, n_games=30, seed=seed)
+        sized[cat] = sizing.size_opportunities(cat, price, sizing.build_volume_index({cat: volume}), balances, USDSEK)
+        steps[cat] = sizing.ladder_steps(cat, sized[cat], ladder, balances, USDSEK)
+
+    result = allocation.allocate(sized, balances, USDSEK, steps if depth else None)
+
+    legs = allocation.items(sized, steps if depth else None)
+    assert len(legs) > 0
+    # every provider's stakes, recomputed from the funded opportunities
+    spent = result.providers['used_sek']
+    for provider, balance in balances.items():
+        balance_sek = balance * (USDSEK if provider in sizing.USD_PROVIDERS else 1.)
+        assert result.providers.loc[provider, 'balance_sek'] == pytest.approx(balance_sek)
+        assert spent[provider] <= balance_sek * (1 + 1e-9)
+    if not depth:
+        # one item per opportunity at its best prices, so each stake goes to that row's providers
+        frames = pd.concat([frame.reset_index() for frame in sized.values()], ignore_index=True)
+        by_provider = pd.concat([
+            result.opportunities['visitor_stake_sek'].groupby(frames['visitor_provider']).sum(),
+            result.opportunities['home_stake_sek'].groupby(frames['home_provider']).sum(),
+        ]).groupby(level=0).sum()
+        assert by_provider.reindex(spent.index).to_numpy() == pytest.approx(spent.to_numpy())
+
+    assert (result.opportunities['payout'] >= 0.).all()
+    assert (result.opportunities['profit_sek'] >= -1e-9).all()
+    assert result.profit_sek <= result.bound_sek * (1 + 1e-9)
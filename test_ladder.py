@@ -0,0 +1,43 @@
+import pandas as pd
+import pytest
+
+import sizing
+
+USDSEK = 10.
+
+
+def test_ladder_steps():
+    sized = pd.DataFrame(
+        {'visitor_line': [0.], 'home_line': [0.], 'line': [0.]},
+        index=pd.Index(['g1'], name='game_id'),
+    )
+    ladder = pd.DataFrame({
+        'game_id': 'g1', 'cat': 'moneyline', 'line': 0.,
+        'side': ['visitor', 'visitor', 'home', 'home'],
+        'provider': ['betfair', 'unibet', 'pinnacle', 'bet365'],
+        'price': [.45, .48, .50, .53],
+        'volume': [90., 480., 150., 530.], # SEK to bet: payouts of 200, 1000, 300 and 1000
+    })[sizing.LADDER_COLUMNS]
+    balances = dict.fromkeys(['betfair', 'unibet', 'pinnacle', 'bet365'], 10_000.)
+
+    steps = sizing.ladder_steps('moneyline', sized, ladder, balances, USDSEK)
+
+    # steps end where either side moves to its next level, up to the shallower side (1200)
+    assert steps['payout'].tolist() == pytest.approx([200., 300., 1200.])
+    assert steps['visitor_provider'].tolist() == ['betfair', 'unibet', 'unibet']
+    assert steps['home_provider'].tolist() == ['pinnacle', 'pinnacle', 'bet365']
+    assert steps['marginal_margin'].tolist() == pytest.approx([.05, .02, -.01])
+    assert steps['visitor_vwap'].tolist() == pytest.approx([.45, .46, .475])
+    assert steps['home_vwap'].tolist() == pytest.approx([.50, .50, .5225])
+    assert steps['stake_sek'].tolist() == pytest.approx([190., 288., 1197.])
+    assert steps['profit_sek'].tolist() == pytest.approx([10., 12., 3.])
+
+    # the most profitable size is the end of the last step with a positive marginal margin
+    depth = sizing.with_depth(sized, steps).iloc[0]
+    assert depth['depth_target_payout'] == pytest.approx(300.)
+    assert depth['depth_profit_sek'] == pytest.approx(12.)
+
+    # a balance caps its provider's level: 45 SEK at betfair buys a payout of 100
+    capped = sizing.ladder_steps('moneyline', sized, ladder, {**balances, 'betfair': 45.}, USDSEK)
+    assert capped['payout'].tolist() == pytest.approx([100., 300., 1100.])
+    assert capped['visitor_provider'].tolist() == ['betfair', 'unibet', 'unibet']
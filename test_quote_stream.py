@@ -0,0 +1,175 @@
+import asyncio
+import math
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('cutgems_utils') # price_feed fetches through it
+
+import price_feed
+import quote_stream
+import sizing
+from quote_stream import Quote, QuoteStore, diff_quotes
+
+
+def quote(side, provider, price, at=0., game_id='g1', cat='moneyline', line=0., volume=math.nan):
+    return Quote(game_id, cat, line, side, provider, price, volume, at)
+
+
+def test_open_update_close():
+    store = QuoteStore(bound=0., clock=lambda: 1000.)
+
+    assert store.apply([quote('visitor', 'betfair', .47, at=1.)]) == [] # one side only
+    (event,) = store.apply([quote('home', 'pinnacle', .50, at=2.)])
+    assert (event.kind, event.visitor_provider, event.home_provider) == ('open', 'betfair', 'pinnacle')
+    assert event.margin == pytest.approx(.03)
+    assert (event.quote_at, event.visitor_at, event.home_at) == (2., 1., 2.)
+
+    # a better price of another provider updates the open arbitrage
+    (event,) = store.apply([quote('home', 'unibet', .49, at=3.)])
+    assert (event.kind, event.home_provider, event.home_price) == ('update', 'unibet', .49)
+    assert event.margin == pytest.approx(.04)
+    # worse prices behind the best one do not
+    assert store.apply([quote('home', 'pinnacle', .51, at=4.)]) == []
+
+    (event,) = store.apply([quote('visitor', 'betfair', .52, at=5.)])
+    assert event.kind == 'close'
+    assert event.margin == pytest.approx(-.01)
+    assert store.open == {}
+
+
+def test_withdrawn_side_closes():
+    store = QuoteStore()
+    store.apply([quote('visitor', 'betfair', .47), quote('home', 'pinnacle', .50)])
+    (event,) = store.apply([quote('home', 'pinnacle', math.nan, at=1.)])
+    assert event.kind == 'close'
+    assert np.isnan(event.margin)
+    assert len(store) == 1
+
+    store.apply([quote('home', 'pinnacle', .50, at=2.)])
+    (event,) = store.remove_provider('betfair', at=3.)
+    assert (event.kind, event.quote_at) == ('close', 3.)
+    assert len(store) == 1 # pinnacle's home quote
+
+
+def test_bound():
+    store = QuoteStore(bound=.02)
+    assert store.apply([quote('visitor', 'betfair', .48), quote('home', 'pinnacle', .51)]) == [] # 1%
+    (event,) = store.apply([quote('home', 'pinnacle', .49, at=1.)]) # 3%
+    assert event.kind == 'open'
+    (event,) = store.apply([quote('home', 'pinnacle', .505, at=2.)]) # 1.5%
+    assert event.kind == 'close'
+
+
+def test_markets_are_separate():
+    store = QuoteStore()
+    events = store.apply([
+        quote('visitor', 'betfair', .45, cat='spread', line=1.5),
+        quote('home', 'pinnacle', .50, cat='spread', line=1.5),
+        quote('home', 'pinnacle', .60, cat='spread', line=2.5),
+        quote('under', 'betfair', .45, cat='total', line=1.5),
+    ])
+    assert [(event.cat, event.line) for event in events] == [('spread', 1.5)]
+    assert set(store.open) == {('g1', 'spread', 1.5)}
+
+
+def test_diff_quotes():
+    previous = [
+        quote('visitor', 'betfair', .45),
+        quote('home', 'betfair', .55),
+        quote('home', 'betfair', .50, cat='spread', line=1.5),
+        quote('home', 'betfair', .50, cat='spread', line=2.5),
+    ]
+    current = [
+        quote('visitor', 'betfair', .45, at=10.), # unchanged
+        quote('home', 'betfair', .56, at=10.), # moved
+        quote('home', 'betfair', .50, cat='spread', line=1.5, volume=100., at=10.), # volume known now
+        quote('visitor', 'betfair', .50, cat='spread', line=2.5, at=10.), # other side of a quoted line
+    ]
+
+    updates = diff_quotes(previous, current)
+    assert updates[:3] == current[1:]
+    (withdrawn,) = updates[3:] # the home spread at 2.5
+    assert (withdrawn.market, withdrawn.side, withdrawn.at) == (('g1', 'spread', 2.5), 'home', 10.)
+    assert np.isnan(withdrawn.price)
+
+    assert diff_quotes(previous, current, refresh=True)[:4] == current
+    assert diff_quotes(current, current) == []
+
+
+def test_refetched_quote_stays_fresh():
+    store = QuoteStore()
+    fetched = [quote('visitor', 'betfair', .47, at=0.)]
+    store.apply(fetched + [quote('home', 'pinnacle', .50, at=0.)])
+
+    # betfair is fetched again at 600 with the same price: no event, but the open arbitrage knows it is fresh
+    refetched = [quote('visitor', 'betfair', .47, at=600.)]
+    assert store.apply(diff_quotes(fetched, refetched, refresh=True)) == []
+    assert store.open[('g1', 'moneyline', 0.)].visitor_at == 600.
+
+    (event,) = store.apply([quote('home', 'pinnacle', .49, at=700.)])
+    assert (event.kind, event.visitor_at, event.home_at) == ('update', 600., 700.)
+
+
+def provider_quotes(provider, visitor_price, home_price, fetched_at):
+    price = pd.DataFrame({
+        'game_id': ['g1'],
+        'best_moneyline_visitor_price': [visitor_price],
+        'best_moneyline_visitor_price_provider': [provider],
+        'best_moneyline_home_price': [home_price],
+        'best_moneyline_home_price_provider': [provider],
+        'margin': [1. - visitor_price - home_price],
+    })
+    volume = {'moneyline': pd.DataFrame({'game_id': ['g1']})}
+    return price_feed.ProviderQuotes(
+        sport='mlb', provider=provider, version=1, fetched_at=fetched_at,
+        info=pd.DataFrame(index=pd.Index(['g1'], name='game_id')),
+        price=MappingProxyType({'moneyline': price}), volume=MappingProxyType(volume),
+        volume_index=sizing.build_volume_index(volume),
+    )
+
+
+def test_poll_provider_withdraws_a_failing_provider(monkeypatch):
+    calls = []
+
+    async def fetch_provider(**kwargs):
+        calls.append(kwargs['version'])
+        if len(calls) > 1:
+            raise ConnectionError('provider down')
+        return provider_quotes('betfair', .45, .50, fetched_at=1.)
+
+    monkeypatch.setattr(price_feed, 'fetch_provider', fetch_provider)
+
+    async def poll():
+        feed = quote_stream.poll_provider('mlb', 'betfair', {}, interval=0., max_failures=2)
+        batches = [await anext(feed) for _ in range(2)]
+        await feed.aclose()
+        return batches
+
+    fetched, withdrawn = asyncio.run(poll())
+    assert calls == [1, 2, 3] # one failure alone withdraws nothing
+
+    store = QuoteStore()
+    (event,) = store.apply(fetched)
+    assert event.kind == 'open'
+    assert all(np.isnan(q.price) for q in withdrawn)
+    (event,) = store.apply(withdrawn)
+    assert event.kind == 'close'
+    assert len(store) == 0
+
+
+def test_run_stream_hands_over_events_per_batch():
+    batches = [
+        [quote('visitor', 'betfair', .47, at=1.)],
+        [quote('home', 'pinnacle', .50, at=2.), quote('home', 'pinnacle', .50, at=2., game_id='g2'), quote('visitor', 'betfair', .45, at=2., game_id='g2')],
+        [quote('visitor', 'betfair', .47, at=3.)], # unchanged
+        [quote('visitor', 'betfair', .52, at=4.)],
+    ]
+    handed = []
+    asyncio.run(quote_stream.run_stream(QuoteStore(), [quote_stream.replay_feed(batches)], handed.append))
+    assert [[(event.kind, event.game_id) for event in events] for events in handed] == [
+        [('open', 'g1'), ('open', 'g2')],
+        [('close', 'g1')],
+    ]
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import sizing
+
+USDSEK = 10.
+PROVIDERS = ['betfair', 'pinnacle', 'polymarket']
+
+
+def get_max_target_sek(volume, provider, cat, side, price, balance, index, line=None):
+    """The sizing of the original pages, for one side of one row."""
+    conversion = USDSEK if provider in sizing.USD_PROVIDERS else 1.
+    try:
+        if cat == 'moneyline':
+            volume_limit = float(volume.loc[index, f'{provider}_{cat}_{side}_volume'])
+        else:
+            volume_limit = volume.loc[[index]]
+            line_col = f'{cat}_{side}' if cat == 'spread' else cat
+            volume_limit = float(volume_limit.loc[volume_limit[line_col] == line, f'{provider}_{cat}_{side}_volume'].iloc[0])
+        return min(
+            balance * conversion / price,
+            volume_limit * (USDSEK if provider in sizing.USD_PROVIDERS else 1./price)
+        )
+    except (KeyError, IndexError):
+        return balance * conversion / price
+
+
+def slate(cat, n_games=12, seed=0):
+    """
+    Price and volume frames like `combine_sportbooks_prices` returns, plus every provider's
+    quotes as a ladder. Spreads and totals have two lines per game, the spread sides are
+    quoted at opposite lines so either side's volume is found only at its own line.
+    """
+    rng = np.random.default_rng(seed)
+    visitor_side, home_side = sizing.SIDES[cat]
+    n_lines = 1 if cat == 'moneyline' else 2
+    n = n_games * n_lines
+    game_id = np.repeat([f'g{i}' for i in range(n_games)], n_lines)
+    price = pd.DataFrame({'game_id': game_id})
+    if cat == 'spread':
+        price['spread_home'] = np.repeat(rng.choice([1.5, 2.5], n_games), 2) * np.tile([-1., 1.], n_games)
+        price['spread_visitor'] = -price['spread_home']
+    elif cat == 'total':
+        price['total'] = np.repeat(np.round(rng.uniform(6., 10., n_games) * 2) / 2, 2) + np.tile([0., 1.], n_games)
+    volume = price.copy()
+
+    fair = rng.uniform(.3, .7, n)
+    quotes = {visitor_side: fair, home_side: 1. - fair}
+    ladder = []
+    for side in (visitor_side, home_side):
+        line_col = sizing.line_column(cat, side)
+        side_line = price[line_col].to_numpy(dtype=float) if line_col else np.zeros(n)
+        side_prices = pd.DataFrame({
+            provider: np.round(quotes[side] + rng.uniform(-.04, .05, n), 3) for provider in PROVIDERS
+        })
+        for provider in PROVIDERS:
+            side_volume = rng.uniform(50., 2000., n)
+            side_volume[rng.uniform(size=n) < .2] = np.nan # unknown volumes fall back to the balance
+            volume[f'{provider}_{cat}_{side}_volume'] = side_volume
+            ladder.append(pd.DataFrame({
+                'game_id': game_id, 'cat': cat, 'line': side_line, 'side': side,
+                'provider': provider, 'price': side_prices[provider], 'volume': side_volume,
+            }))
+        price[f'best_{cat}_{side}_price_provider'] = side_prices.idxmin(axis=1)
+        price[f'best_{cat}_{side}_price'] = side_prices.min(axis=1)
+    price['margin'] = 1. - (price[f'best_{cat}_{visitor_side}_price'] + price[f'best_{cat}_{home_side}_price'])
+    return price, volume, pd.concat(ladder, ignore_index=True)[sizing.LADDER_COLUMNS]
+
+
+@pytest.mark.parametrize('cat', ['moneyline', 'spread', 'total'])
+def test_size_opportunities_matches_original_sizing(cat):
+    price, volume, _ = slate(cat)
+    balances = {'betfair': 1500., 'pinnacle': 4000., 'polymarket': 80.}
+    sized = sizing.size_opportunities(cat, price, sizing.build_volume_index({cat: volume}), balances, USDSEK)
+    volume = volume.set_index('game_id')
+    visitor_side, home_side = sizing.SIDES[cat]
+
+    for row, (game_id, got) in zip(price.itertuples(index=False), sized.iterrows()):
+        assert game_id == row.game_id
+        row = row._asdict()
+        expected = {}
+        for key, side in [('visitor', visitor_side), ('home', home_side)]:
+            line = row[f'{cat}_{side}'] if cat == 'spread' else row.get(cat) # each spread side at its own line
+            provider = row[f'best_{cat}_{side}_price_provider']
+            expected[key] = get_max_target_sek(
+                volume, provider, cat, side, row[f'best_{cat}_{side}_price'], balances[provider], game_id, line
+            )
+            assert got[f'max_{key}_target_sek'] == pytest.approx(expected[key])
+
+        limiting_side = 'home' if expected['home'] < expected['visitor'] else 'visitor'
+        assert got['limiting_side'] == limiting_side
+        assert got['max_target_payout'] == pytest.approx(expected[limiting_side])
+        # split: both sides are staked to the same payout
+        assert got['visitor_stake_sek_split'] == pytest.approx(expected[limiting_side] * got['visitor_price'])
+        assert got['home_stake_sek_split'] == pytest.approx(expected[limiting_side] * got['home_price'])